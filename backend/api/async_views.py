@@ -0,0 +1,241 @@
+"""Async versions of the hot read endpoints for ASGI deployments.
+
+They are routed in front of the viewsets when ASYNC_READ_VIEWS is on;
+it is off by default, as they only pay off under an ASGI server and
+benchmark_asgi should confirm that they do. A view serves the GET
+requests it knows with the async ORM and cache API and hands
+everything else (writes, cursor pagination, the browsable API, PDF
+export) to the viewset action, so the API and its responses stay the
+same, caches and ETags included.
+
+Django 4.2 still runs every query in a worker thread; what these views
+save is the thread hop around the whole request, which lets one worker
+interleave many requests that wait on the database or the cache.
+"""
+from contextlib import nullcontext
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse
+from rest_framework.exceptions import NotAcceptable, NotFound
+from rest_framework.response import Response
+
+from api.cache import (
+    HIT, MISS, RECIPE, RECIPES, USERS, acount_outcome, aget_versions,
+    response_cache_key
+)
+from api.catalog import INGREDIENTS, TAGS, ingredient_index
+from api.conditional import (
+    check_preconditions, conditional_headers, set_validators
+)
+from api.exports import ashopping_list_response
+from api.pagination import RecipePagination
+from api.replica import primary_reads
+from api.serializers import RecipeReadSerializer
+from api.views import LIST_STATE, IngredientViewSet, RecipeViewSet
+from recipes.models import Recipe
+
+
+def accepts(view, request, formats):
+    """Whether ``view`` would render ``request`` as one of ``formats``."""
+    try:
+        renderer, media_type = view.perform_content_negotiation(request)
+    except (Http404, NotAcceptable):
+        return False
+    # Indented JSON is left to the viewset.
+    return renderer.format in formats and 'indent' not in media_type
+
+
+def rendered(response):
+    """``response`` rendered in the event loop.
+
+    Django would render a DRF response of an async view in a worker
+    thread, so it is copied into a plain HttpResponse.
+    """
+    if not isinstance(response, Response):
+        return response
+    response.render()
+    return HttpResponse(response.content, status=response.status_code,
+                        headers=response.headers)
+
+
+def read_view(fallback, formats=('json',), delegate_if=None):
+    """Serve GET requests rendered as one of ``formats`` asynchronously.
+
+    Other requests, and those ``delegate_if`` (called with the query
+    parameters) accepts, go to the synchronous ``fallback`` view. The
+    view is called with the viewset instance ``fallback`` would dispatch
+    to and its DRF request, after the viewset's authentication,
+    permission checks and content negotiation; its errors and response
+    go through the viewset's exception handling and finalize_response.
+    """
+    def decorator(view_function):
+        @wraps(view_function)
+        async def wrapper(request, **kwargs):
+            if (request.method != 'GET'
+                    or delegate_if and delegate_if(request.GET)):
+                return await sync_to_async(fallback)(request, **kwargs)
+            # What the fallback does before APIView.dispatch.
+            view = fallback.cls(**fallback.initkwargs)
+            view.action_map = {'head': fallback.actions['get'],
+                               **fallback.actions}
+            for method, action in view.action_map.items():
+                setattr(view, method, getattr(view, action))
+            view.args, view.kwargs = (), kwargs
+            drf_request = view.initialize_request(request, **kwargs)
+            view.format_kwarg = view.get_format_suffix(**kwargs)
+            if not accepts(view, drf_request, formats):
+                return await sync_to_async(fallback)(request, **kwargs)
+            view.request = drf_request
+            view.headers = view.default_response_headers
+            try:
+                # Token authentication queries the database.
+                await sync_to_async(view.initial)(drf_request, **kwargs)
+                response = await view_function(view, drf_request, **kwargs)
+            except Exception as exc:
+                response = view.handle_exception(exc)
+            return rendered(
+                view.finalize_response(drf_request, response, **kwargs))
+        # The fallback views are exempt themselves, but the middleware
+        # only looks at the view it resolved.
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+async def respond(request, version_names, validators, build, bypass=False):
+    """The anonymous response cache and conditional GET of async views.
+
+    Same as cache_anonymous_response over conditional: ``validators``
+    and ``build`` are coroutine functions returning what the viewset's
+    validator method and action return (the latter as data), ``bypass``
+    is what the viewset's bypass method returns.
+    """
+    key = None
+    if (settings.RESPONSE_CACHE_TIMEOUT and not bypass
+            and not request.user.is_authenticated):
+        key = response_cache_key(
+            request, await aget_versions(*version_names))
+        entry = await cache.aget(key)
+        if entry is not None:
+            await acount_outcome(HIT)
+            data, headers = entry
+            response = Response(data, headers=headers)
+            response['X-Cache'] = 'HIT'
+            return check_preconditions(request, response)
+        await acount_outcome(MISS)
+    with primary_reads() if key is not None else nullcontext():
+        found = await validators()
+        response = None
+        if found is not None:
+            headers = HttpResponse()
+            set_validators(headers, *found)
+            response = check_preconditions(request, headers)
+            if response is headers:
+                response = None
+        if response is None:
+            data = await build()
+            response = Response(data)
+            if found is not None:
+                set_validators(response, *found)
+            if key is not None:
+                await cache.aset(key, (data, conditional_headers(response)),
+                                 settings.RESPONSE_CACHE_TIMEOUT)
+    if key is not None:
+        response['X-Cache'] = 'MISS'
+    return response
+
+
+# ─────────────────────────────────────────────────────────────
+#                      INGREDIENTS
+# ─────────────────────────────────────────────────────────────
+
+@read_view(IngredientViewSet.as_view(
+    {'get': 'list'}, basename='ingredient', detail=False, suffix='List'
+), delegate_if=lambda query: not query.get('name'))
+async def ingredient_list(view, request):
+    return Response(await ingredient_index.asearch(
+        request.query_params['name']))
+
+
+# ─────────────────────────────────────────────────────────────
+#                         RECIPES
+# ─────────────────────────────────────────────────────────────
+
+def filter_recipes(view):
+    """Filtered recipes for the page and for the list validators.
+
+    Validating the tag filter may rebuild the tag catalog, so this runs
+    outside of the event loop.
+    """
+    return (view.filter_queryset(view.get_queryset()),
+            view.filter_queryset(Recipe.objects.all()))
+
+
+@read_view(RecipeViewSet.as_view(
+    {'get': 'list', 'post': 'create'},
+    basename='recipe', detail=False, suffix='List'
+), delegate_if=lambda query: RecipePagination.cursor_query_param in query)
+async def recipe_list(view, request):
+    # Filled by validators(), which respond() calls before build().
+    recipes = None
+
+    async def validators():
+        nonlocal recipes
+        recipes, filtered = await sync_to_async(filter_recipes)(view)
+        if view.orders_by_counter(request):
+            return None
+        state = await filtered.order_by().aaggregate(**LIST_STATE)
+        return view.list_etag(request, state,
+                              await view.aviewer_state(request)), None
+
+    async def build():
+        page = await view.paginator.apaginate_queryset(recipes, request)
+        serializer = RecipeReadSerializer(
+            context=view.get_serializer_context())
+        return view.paginator.get_paginated_response(
+            await serializer.arepresent(page)).data
+
+    return await respond(request, (RECIPES, TAGS, INGREDIENTS, USERS),
+                         validators, build,
+                         bypass=view.orders_by_counter(request))
+
+
+@read_view(RecipeViewSet.as_view({
+    'get': 'retrieve', 'put': 'update', 'patch': 'partial_update',
+    'delete': 'destroy'
+}, basename='recipe', detail=True, suffix='Instance'))
+async def recipe_detail(view, request, pk):
+
+    async def validators():
+        return view.detail_validators(
+            request,
+            await Recipe.objects.filter(pk=pk).values_list(
+                'updated_at', flat=True).afirst(),
+            await view.aviewer_state(request)
+        )
+
+    async def build():
+        # IsAuthorOrReadOnly lets every safe request through.
+        recipe = await view.get_queryset().filter(pk=pk).afirst()
+        if recipe is None:
+            raise NotFound('No %s matches the given query.'
+                           % Recipe._meta.object_name)
+        serializer = RecipeReadSerializer(
+            context=view.get_serializer_context())
+        return (await serializer.arepresent([recipe]))[0]
+
+    return await respond(
+        request, (RECIPE.format(pk=pk), TAGS, INGREDIENTS, USERS),
+        validators, build)
+
+
+@read_view(RecipeViewSet.as_view(
+    {'get': 'download_shopping_cart'}, basename='recipe', detail=False,
+    **RecipeViewSet.download_shopping_cart.kwargs
+), formats=('txt', 'csv'))
+async def download_shopping_cart(view, request):
+    return await ashopping_list_response(view.shopping_list_items(request),
+                                         request.accepted_renderer.format)
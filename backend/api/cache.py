@@ -0,0 +1,194 @@
+import hashlib
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from api.conditional import check_preconditions, conditional_headers
+from api.replica import primary_reads
+
+RECIPES = 'recipes'
+RECIPE = 'recipe:{pk}'
+USERS = 'users'
+USER = 'user:{pk}'
+
+HIT = 'hit'
+MISS = 'miss'
+
+
+def _version_key(name):
+    return f'version:{name}'
+
+
+def _new_version():
+    return uuid.uuid4().hex
+
+
+def get_version(name):
+    """Current version token of a cached resource.
+
+    Versions live in the configured Django cache, so with a shared
+    backend every worker sees an invalidation done by any other one.
+    """
+    return cache.get_or_set(_version_key(name), _new_version, timeout=None)
+
+
+def get_versions(*names):
+    """Version tokens of several resources in one cache round trip."""
+    keys = [_version_key(name) for name in names]
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+async def aget_version(name):
+    """get_version() for async views."""
+    return await cache.aget_or_set(_version_key(name), _new_version,
+                                   timeout=None)
+
+
+async def aget_versions(*names):
+    """get_versions() for async views."""
+    keys = [_version_key(name) for name in names]
+    versions = await cache.aget_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        await cache.aset_many(missing, timeout=None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump_version(name):
+    cache.set(_version_key(name), _new_version(), timeout=None)
+
+
+def bump_versions(*names):
+    cache.set_many({_version_key(name): _new_version() for name in names},
+                   timeout=None)
+
+
+def recipe_fragment_key(recipe, base_url):
+    """Key of a recipe representation by id and updated_at.
+
+    The base URL is part of the key because image URLs are absolute.
+    """
+    base = hashlib.md5(base_url.encode(), usedforsecurity=False)
+    return (f'fragment:recipe:{recipe.pk}:'
+            f'{recipe.updated_at.timestamp()}:{base.hexdigest()[:8]}')
+
+
+# ─────────────────────────────────────────────────────────────
+#                     RESPONSE CACHE
+# ─────────────────────────────────────────────────────────────
+
+def _metric_key(outcome):
+    return f'metrics:response_cache:{outcome}'
+
+
+def count_outcome(outcome):
+    """Count a response cache outcome when the backend is shared.
+
+    Per-process counts of the local-memory backend would be meaningless
+    and cost two cache calls per anonymous request.
+    """
+    if not settings.SHARED_CACHE:
+        return
+    key = _metric_key(outcome)
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, timeout=None)
+
+
+async def acount_outcome(outcome):
+    """count_outcome() for async views."""
+    if not settings.SHARED_CACHE:
+        return
+    key = _metric_key(outcome)
+    if not await cache.aadd(key, 1, timeout=None):
+        try:
+            await cache.aincr(key)
+        except ValueError:
+            await cache.aadd(key, 1, timeout=None)
+
+
+def response_cache_stats():
+    """Hits and misses counted since the last reset.
+
+    Only counted with a shared backend (settings.SHARED_CACHE).
+    """
+    keys = {outcome: _metric_key(outcome) for outcome in (HIT, MISS)}
+    values = cache.get_many(keys.values())
+    return {outcome: values.get(key, 0) for outcome, key in keys.items()}
+
+
+def reset_response_cache_stats():
+    cache.delete_many([_metric_key(outcome) for outcome in (HIT, MISS)])
+
+
+def response_cache_key(request, versions):
+    """Key of a response by URL, normalized query and data versions.
+
+    Query parameters are sorted by name and value, so the same filter
+    written in another order shares the entry. The host is part of the
+    key because the payload holds absolute URLs.
+    """
+    query = sorted(
+        (name, value)
+        for name, values in request.query_params.lists()
+        for value in values
+    )
+    raw = repr((request.build_absolute_uri(request.path), query, versions))
+    return 'response:' + hashlib.md5(
+        raw.encode(), usedforsecurity=False).hexdigest()
+
+
+def cache_anonymous_response(*version_names, bypass=None):
+    """Cache the data of successful anonymous GET responses of an action.
+
+    ``version_names`` are formatted with the URL kwargs, e.g.
+    ``RECIPE`` becomes the version of the requested recipe. Bumping any
+    of them makes the stored entries unreachable; RESPONSE_CACHE_TIMEOUT
+    bounds the life of the rest (0 turns the cache off). The ETag and
+    Last-Modified of a response are stored with its data, so cached
+    responses answer conditional requests too. Responses carry an
+    ``X-Cache: HIT`` or ``MISS`` header and the outcomes are counted for
+    response_cache_stats. ``bypass`` names a view method that takes the
+    request and returns True for requests whose responses depend on data
+    no version covers; those are neither cached nor looked up.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            timeout = settings.RESPONSE_CACHE_TIMEOUT
+            if (not timeout or request.method != 'GET'
+                    or request.user.is_authenticated
+                    or bypass and getattr(view, bypass)(request)):
+                return method(view, request, *args, **kwargs)
+            key = response_cache_key(request, get_versions(
+                *(name.format(**kwargs) for name in version_names)))
+            entry = cache.get(key)
+            if entry is not None:
+                count_outcome(HIT)
+                data, headers = entry
+                response = Response(data, headers=headers)
+                response['X-Cache'] = 'HIT'
+                return check_preconditions(request, response)
+            count_outcome(MISS)
+            # Entries outlive the request and must not hold replica lag.
+            with primary_reads():
+                response = method(view, request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key,
+                          (response.data, conditional_headers(response)),
+                          timeout)
+            response['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
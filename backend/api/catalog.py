@@ -0,0 +1,146 @@
+import hashlib
+import threading
+from bisect import bisect_left
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from api.cache import aget_version, get_version
+from api.renderers import FastJSONRenderer
+from api.replica import primary_reads
+from api.serializers import IngredientSerializer, TagSerializer
+from recipes.models import Ingredient, Tag
+
+INGREDIENTS = 'ingredients'
+TAGS = 'tags'
+
+
+class VersionedCatalog:
+    """Per-worker value rebuilt whenever its cache version changes.
+
+    Version tokens live in the configured Django cache, so with a shared
+    backend an invalidation done by one worker is seen by all of them.
+    """
+
+    version_name = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = (None, None)
+
+    def build(self):
+        raise NotImplementedError
+
+    def get(self):
+        version = get_version(self.version_name)
+        state = self._state
+        if state[0] != version:
+            with self._lock:
+                if self._state[0] != version:
+                    # Built under the current version for good, so not
+                    # from a lagging replica.
+                    with primary_reads():
+                        self._state = (version, self.build())
+                state = self._state
+        return state[1]
+
+    async def aget(self):
+        """get() for async views; a rebuild runs in a worker thread."""
+        state = self._state
+        if state[0] == await aget_version(self.version_name):
+            return state[1]
+        return await sync_to_async(self.get)()
+
+
+class IngredientIndex(VersionedCatalog):
+    """Sorted index of casefolded ingredient names for autocomplete.
+
+    Lookups are a binary search over the index instead of a
+    case-insensitive LIKE scan.
+    """
+
+    version_name = INGREDIENTS
+
+    def build(self):
+        items = sorted(
+            IngredientSerializer(Ingredient.objects.all(), many=True).data,
+            key=lambda item: (item['name'].casefold(),
+                              item['name'], item['id'])
+        )
+        return [item['name'].casefold() for item in items], items
+
+    def search(self, prefix, limit=None):
+        return self.lookup(self.get(), prefix, limit)
+
+    async def asearch(self, prefix, limit=None):
+        return self.lookup(await self.aget(), prefix, limit)
+
+    def lookup(self, index, prefix, limit=None):
+        if limit is None:
+            limit = settings.INGREDIENT_SEARCH_LIMIT
+        keys, items = index
+        prefix = prefix.casefold()
+        results = []
+        for position in range(bisect_left(keys, prefix), len(keys)):
+            if len(results) >= limit or not keys[position].startswith(prefix):
+                break
+            results.append(items[position])
+        return results
+
+
+class TagSlugs(VersionedCatalog):
+    """Tag ids by slug for validating and resolving the tag filter."""
+
+    version_name = TAGS
+
+    def build(self):
+        return dict(Tag.objects.values_list('slug', 'id'))
+
+
+class CatalogPayload(VersionedCatalog):
+    """Rendered JSON body of a whole catalog and its strong ETag."""
+
+    def __init__(self, version_name, queryset, serializer_class):
+        super().__init__()
+        self.version_name = version_name
+        self.queryset = queryset
+        self.serializer_class = serializer_class
+
+    def build(self):
+        body = FastJSONRenderer().render(
+            self.serializer_class(self.queryset.all(), many=True).data
+        )
+        etag = quote_etag(
+            hashlib.md5(body, usedforsecurity=False).hexdigest()
+        )
+        return body, etag
+
+    def response(self, request):
+        body, etag = self.get()
+        response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+        return get_conditional_response(
+            request, etag=etag, response=response
+        ) or response
+
+
+ingredient_index = IngredientIndex()
+ingredient_catalog = CatalogPayload(
+    INGREDIENTS, Ingredient.objects.all(), IngredientSerializer
+)
+tag_catalog = CatalogPayload(TAGS, Tag.objects.all(), TagSerializer)
+tag_slugs = TagSlugs()
+
+
+def warm_up():
+    """Build the catalogs before the first request hits the worker."""
+    try:
+        for catalog in (ingredient_index, ingredient_catalog,
+                        tag_catalog, tag_slugs):
+            catalog.get()
+    except DatabaseError:
+        pass
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """Deployments run several processes, which need a shared cache."""
+    if settings.SHARED_CACHE:
+        return []
+    return [Warning(
+        'CACHE_BACKEND is not shared between processes.',
+        hint=('Cache invalidations made by one worker, the admin or a '
+              'management command will not reach the others. Point '
+              'CACHE_BACKEND and CACHE_LOCATION at Redis.'),
+        id='api.W001',
+    )]
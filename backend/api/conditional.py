@@ -0,0 +1,68 @@
+import hashlib
+from functools import wraps
+
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+# Headers that a stored copy of a response needs to answer conditional
+# requests the same way.
+CONDITIONAL_HEADERS = ('ETag', 'Last-Modified', 'Vary')
+
+
+def make_etag(*parts):
+    """Weak ETag over the values that determine a response body."""
+    digest = hashlib.md5(repr(parts).encode(), usedforsecurity=False)
+    return 'W/' + quote_etag(digest.hexdigest())
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # The ETag covers the per-user flags of the body.
+    patch_vary_headers(response, ('Authorization',))
+
+
+def conditional_headers(response):
+    return {header: response[header] for header in CONDITIONAL_HEADERS
+            if header in response}
+
+
+def check_preconditions(request, response):
+    """``response``, or the 304/412 that its validators call for."""
+    return get_conditional_response(
+        request,
+        etag=response.get('ETag'),
+        last_modified=parse_http_date_safe(
+            response.get('Last-Modified', '')),
+        response=response
+    )
+
+
+def conditional(validators):
+    """Answer conditional GETs of a view action before it runs.
+
+    ``validators`` names a view method that takes the action's arguments
+    and returns the ETag and the last modification time (or None) of the
+    response, or None when they cannot be determined cheaply. A matching
+    ``If-None-Match`` or ``If-Modified-Since`` gets a 304 straight away;
+    otherwise the action runs and its response carries the validators.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            found = getattr(view, validators)(request, *args, **kwargs)
+            if found is None:
+                return method(view, request, *args, **kwargs)
+            headers = HttpResponse()
+            set_validators(headers, *found)
+            response = check_preconditions(request, headers)
+            if response is not headers:
+                return response
+            response = method(view, request, *args, **kwargs)
+            if response.status_code == 200:
+                set_validators(response, *found)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,144 @@
+import csv
+import io
+import logging
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+
+from foodgram.const import EXPORT_CHUNK_SIZE, EXPORT_ITERATOR_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+EMPTY_SHOPPING_LIST = 'Список пуст.'
+PDF_FONT = 'ShoppingListFont'
+CSV_HEADER = ('Ингредиент', 'Единица измерения', 'Количество')
+
+
+def _buffered(parts):
+    """Group small strings into chunks of about EXPORT_CHUNK_SIZE."""
+    buffer, size = [], 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= EXPORT_CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _rows(items):
+    for item in items.iterator(chunk_size=EXPORT_ITERATOR_CHUNK_SIZE):
+        yield item['name'], item['unit'], item['total']
+
+
+def _text(rows):
+    separator = ''
+    for name, unit, total in rows:
+        yield f'{separator}{name} ({unit}) — {total}'
+        separator = '\n'
+    if not separator:
+        yield EMPTY_SHOPPING_LIST
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def _csv(rows):
+    writer = csv.writer(_Echo())
+    # BOM makes spreadsheet software detect UTF-8 for Cyrillic names.
+    yield '\ufeff' + writer.writerow(CSV_HEADER)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _pdf(rows):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    # Registered by pdf_export_available().
+    font = PDF_FONT
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    margin, line_height = 50, 18
+    y = height - margin
+    pdf.setFont(font, 12)
+    empty = True
+    for name, unit, total in rows:
+        if y < margin:
+            pdf.showPage()
+            pdf.setFont(font, 12)
+            y = height - margin
+        pdf.drawString(margin, y, f'{name} ({unit}) — {total}')
+        y -= line_height
+        empty = False
+    if empty:
+        pdf.drawString(margin, y, EMPTY_SHOPPING_LIST)
+    pdf.save()
+    # PDF needs a trailing cross-reference table, so the document is
+    # assembled first and only then sent in chunks.
+    buffer.seek(0)
+    yield from iter(lambda: buffer.read(EXPORT_CHUNK_SIZE), b'')
+
+
+EXPORTERS = {
+    'txt': (_text, 'text/plain; charset=utf-8'),
+    'csv': (_csv, 'text/csv; charset=utf-8'),
+    'pdf': (_pdf, 'application/pdf'),
+}
+
+
+def pdf_export_available():
+    """Register SHOPPING_LIST_PDF_FONT if reportlab is installed.
+
+    A font that fails to load inside the streamed response would cut the
+    download short after the headers, so the pdf format is only offered
+    when it loads here.
+    """
+    try:
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFError, TTFont
+    except ImportError:
+        return False
+    try:
+        pdfmetrics.registerFont(
+            TTFont(PDF_FONT, settings.SHOPPING_LIST_PDF_FONT))
+    except TTFError as error:
+        logger.warning('PDF export is disabled: %s', error)
+        return False
+    return True
+
+
+def shopping_list_response(items, export_format):
+    """Stream ``items`` (name, unit, total values) as a file download."""
+    exporter, content_type = EXPORTERS[export_format]
+    content = exporter(_rows(items))
+    if export_format != 'pdf':
+        content = _buffered(content)
+    response = StreamingHttpResponse(content, content_type=content_type)
+    return _attachment(response, export_format)
+
+
+async def ashopping_list_response(items, export_format):
+    """shopping_list_response() for async views, text formats only.
+
+    A list has at most one row per ingredient, so the rows are fetched
+    with the async ORM first and the file is sent in one piece.
+    """
+    rows = [
+        (item['name'], item['unit'], item['total']) async for item in
+        items.aiterator(chunk_size=EXPORT_ITERATOR_CHUNK_SIZE)
+    ]
+    exporter, content_type = EXPORTERS[export_format]
+    response = HttpResponse(''.join(exporter(rows)),
+                            content_type=content_type)
+    return _attachment(response, export_format)
+
+
+def _attachment(response, export_format):
+    response['Content-Disposition'] = (
+        f'attachment; filename="shopping_list.{export_format}"')
+    return response
@@ -1,21 +1,16 @@
 import django_filters
+from django.db.models import Exists, OuterRef
+from rest_framework.filters import OrderingFilter
 
-from recipes.models import Recipe, Ingredient
+from api.catalog import tag_slugs
+from recipes import search
+from recipes.models import Recipe
 
+TAGS_MATCH_CHOICES = (('any', 'any'), ('all', 'all'))
 
-# ─────────────────────────────────────────────────────────────
-#                        INGREDIENTS
-# ─────────────────────────────────────────────────────────────
 
-class IngredientFilter(django_filters.FilterSet):
-    name = django_filters.CharFilter(
-        field_name='name',
-        lookup_expr='istartswith'
-    )
-
-    class Meta:
-        model = Ingredient
-        fields = ('name',)
+def tag_choices():
+    return [(slug, slug) for slug in tag_slugs.get()]
 
 
 # ─────────────────────────────────────────────────────────────
@@ -23,8 +18,13 @@ class IngredientFilter(django_filters.FilterSet):
 # ─────────────────────────────────────────────────────────────
 
 class RecipeFilter(django_filters.FilterSet):
-    tags = django_filters.AllValuesMultipleFilter(
-        field_name='tags__slug'
+    tags = django_filters.MultipleChoiceFilter(
+        choices=tag_choices,
+        method='filter_tags'
+    )
+    tags_match = django_filters.ChoiceFilter(
+        choices=TAGS_MATCH_CHOICES,
+        method='filter_tags_match'
     )
     author = django_filters.NumberFilter(
         field_name='author__id'
@@ -35,11 +35,32 @@ class RecipeFilter(django_filters.FilterSet):
     is_in_shopping_cart = django_filters.CharFilter(
         method='filter_in_cart'
     )
+    search = django_filters.CharFilter(
+        method='filter_search'
+    )
 
     class Meta:
         model = Recipe
         fields = ('tags', 'author')
 
+    def filter_tags(self, qs, name, value):
+        """Recipes with any (default) or all of the tags, without joins."""
+        slugs = tag_slugs.get()
+        # A tag deleted since the form was validated matches no recipe.
+        tag_ids = {slugs[slug] for slug in value if slug in slugs}
+        links = Recipe.tags.through.objects.filter(recipe=OuterRef('pk'))
+        if self.form.cleaned_data.get('tags_match') == 'all':
+            if len(tag_ids) < len(set(value)):
+                return qs.none()
+            for tag_id in tag_ids:
+                qs = qs.filter(Exists(links.filter(tag_id=tag_id)))
+            return qs
+        return qs.filter(Exists(links.filter(tag_id__in=tag_ids)))
+
+    def filter_tags_match(self, qs, name, value):
+        # Only read by filter_tags.
+        return qs
+
     def filter_favorited(self, qs, name, value):
         user = self.request.user
         if user.is_authenticated:
@@ -51,3 +72,20 @@ class RecipeFilter(django_filters.FilterSet):
         if user.is_authenticated:
             return qs.filter(in_shopping_cart__user=user)
         return qs
+
+    def filter_search(self, qs, name, value):
+        return search.search(qs, value)
+
+
+class RecipeOrderingFilter(OrderingFilter):
+    """``ordering`` query parameter with the feed order as tie-breaker."""
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering:
+            return ordering
+        fields = {field.lstrip('-') for field in ordering}
+        return list(ordering) + [
+            field for field in Recipe._meta.ordering
+            if field.lstrip('-') not in fields
+        ]
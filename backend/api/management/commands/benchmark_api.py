@@ -0,0 +1,200 @@
+import base64
+import json
+import statistics
+import time
+from contextlib import ExitStack
+from functools import partial
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment
+)
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+DEFAULT_BUDGETS = (
+    Path(settings.BASE_DIR) / 'api' / 'benchmarks' / 'budgets.json'
+)
+
+
+def cached(request, **timeouts):
+    """Send the request with the given caches turned on."""
+    with override_settings(**timeouts):
+        return request()
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = ('Measures latency and SQL query counts of the hot API endpoints '
+            'against the current (seeded) database and checks them '
+            'against the stored budgets; all writes are rolled back')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20,
+            help='Measured requests per endpoint (default: 20)'
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=2,
+            help='Unmeasured requests per endpoint (default: 2)'
+        )
+        parser.add_argument(
+            '--budgets',
+            type=Path,
+            default=DEFAULT_BUDGETS,
+            help=f'Budgets JSON file (default: {DEFAULT_BUDGETS})'
+        )
+
+    def create_recipe_payload(self, recipe, ingredient_count):
+        # Reusing stored image bytes keeps the rolled-back run from
+        # leaving new files in the media storage.
+        with recipe.image.open('rb') as image_file:
+            image = base64.b64encode(image_file.read()).decode()
+        return {
+            'name': 'benchmark',
+            'text': 'benchmark',
+            'cooking_time': 10,
+            'image': f'data:image/png;base64,{image}',
+            'tags': list(Tag.objects.values_list('id', flat=True)[:3]),
+            'ingredients': [
+                {'id': pk, 'amount': 10} for pk in
+                Ingredient.objects.order_by('id')
+                .values_list('id', flat=True)[:ingredient_count]
+            ],
+        }
+
+    def endpoints(self, client):
+        """Name -> (request without arguments, expected status code)."""
+        user = (User.objects.filter(shopping_cart__isnull=False,
+                                    follows__isnull=False)
+                .order_by('id').first())
+        recipe = Recipe.objects.order_by('id').first()
+        if user is None or recipe is None:
+            raise CommandError('The database has no data to benchmark, '
+                               'run seed_dataset first.')
+        tags = '&'.join(f'tags={slug}' for slug in
+                        Tag.objects.order_by('id')
+                        .values_list('slug', flat=True)[:2])
+        token, _ = Token.objects.get_or_create(user=user)
+        auth = {'HTTP_AUTHORIZATION': f'Token {token.key}'}
+        get = client.get
+        detail_etag = get(f'/api/recipes/{recipe.id}/', **auth)['ETag']
+        list_etag = get('/api/recipes/', **auth)['ETag']
+        return {
+            'recipe_list_anonymous': (partial(get, '/api/recipes/'), 200),
+            'recipe_list_anonymous_cached': (
+                partial(cached, partial(get, '/api/recipes/'),
+                        RESPONSE_CACHE_TIMEOUT=300), 200),
+            'recipe_detail_anonymous_cached': (
+                partial(cached, partial(get, f'/api/recipes/{recipe.id}/'),
+                        RESPONSE_CACHE_TIMEOUT=300), 200),
+            'recipe_list_authenticated_fragments': (
+                partial(cached, partial(get, '/api/recipes/', **auth),
+                        RECIPE_FRAGMENT_TIMEOUT=300), 200),
+            'recipe_detail_authenticated_fragments': (
+                partial(cached,
+                        partial(get, f'/api/recipes/{recipe.id}/', **auth),
+                        RECIPE_FRAGMENT_TIMEOUT=300), 200),
+            'recipe_list_authenticated': (
+                partial(get, '/api/recipes/', **auth), 200),
+            'recipe_detail_anonymous': (
+                partial(get, f'/api/recipes/{recipe.id}/'), 200),
+            'recipe_detail_authenticated': (
+                partial(get, f'/api/recipes/{recipe.id}/', **auth), 200),
+            'recipe_detail_not_modified': (
+                partial(get, f'/api/recipes/{recipe.id}/',
+                        HTTP_IF_NONE_MATCH=detail_etag, **auth), 304),
+            'recipe_list_not_modified': (
+                partial(get, '/api/recipes/',
+                        HTTP_IF_NONE_MATCH=list_etag, **auth), 304),
+            'recipe_list_tags_filter': (
+                partial(get, f'/api/recipes/?{tags}', **auth), 200),
+            'recipe_list_author_filter': (
+                partial(get, f'/api/recipes/?author={recipe.author_id}',
+                        **auth), 200),
+            'subscriptions': (
+                partial(get, '/api/users/subscriptions/?recipes_limit=3',
+                        **auth), 200),
+            'download_shopping_cart': (
+                partial(get, '/api/recipes/download_shopping_cart/',
+                        **auth), 200),
+            'ingredient_autocomplete': (
+                partial(get, '/api/ingredients/?name=са'), 200),
+            'recipe_create_50_ingredients': (
+                partial(client.post, '/api/recipes/',
+                        self.create_recipe_payload(recipe, 50),
+                        content_type='application/json', **auth), 201),
+        }
+
+    def measure(self, name, request, expected_status, iterations, warmup):
+        timings, queries = [], 0
+        for iteration in range(warmup + iterations):
+            # Reads may go to the replica database.
+            with ExitStack() as stack:
+                contexts = [
+                    stack.enter_context(CaptureQueriesContext(connection))
+                    for connection in connections.all()
+                ]
+                started = time.perf_counter()
+                response = request()
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                elapsed = time.perf_counter() - started
+            if response.status_code != expected_status:
+                raise CommandError(
+                    f'{name} returned {response.status_code}')
+            if iteration >= warmup:
+                timings.append(elapsed * 1000)
+                queries = max(queries, sum(map(len, contexts)))
+        return {
+            'p50_ms': statistics.median(timings),
+            'p95_ms': percentile(timings, 0.95),
+            'queries': queries,
+        }
+
+    def handle(self, *args, **options):
+        budgets = json.loads(options['budgets'].read_text(encoding='utf-8'))
+        setup_test_environment()
+        client = Client()
+        failures = []
+        # Tokens created for the run are rolled back with everything else.
+        # The response and fragment caches are only on for the *_cached
+        # and *_fragments endpoints, the others measure the full request.
+        with transaction.atomic(), override_settings(
+                RESPONSE_CACHE_TIMEOUT=0, RECIPE_FRAGMENT_TIMEOUT=0):
+            for name, (request, status) in self.endpoints(client).items():
+                result = self.measure(name, request, status,
+                                      options['iterations'],
+                                      options['warmup'])
+                budget = budgets.get(name, {})
+                self.stdout.write(
+                    f'{name:<38} p50 {result["p50_ms"]:8.1f} ms  '
+                    f'p95 {result["p95_ms"]:8.1f} ms  '
+                    f'queries {result["queries"]:3}'
+                )
+                for key in ('queries', 'p95_ms'):
+                    if key in budget and result[key] > budget[key]:
+                        failures.append(
+                            f'{name}: {key} {round(result[key], 1):g} '
+                            f'exceeds the budget of {budget[key]}'
+                        )
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError('Budgets exceeded:\n' + '\n'.join(failures))
+        self.stdout.write(
+            self.style.SUCCESS('All endpoints are within budget'))
@@ -0,0 +1,205 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from importlib.util import find_spec
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from api.management.commands.benchmark_api import percentile
+from recipes.models import Ingredient, Recipe
+from users.models import User
+
+HOST = '127.0.0.1'
+
+
+async def fetch(port, request):
+    """Status code of one request sent over a new connection."""
+    reader, writer = await asyncio.open_connection(HOST, port)
+    try:
+        writer.write(request)
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    return int(response[9:12]) if response[:5] == b'HTTP/' else None
+
+
+async def load(port, requests, concurrency, duration):
+    """Latencies and failures of ``concurrency`` clients sending
+    ``requests`` in turn for ``duration`` seconds."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + duration
+    latencies, failures = [], 0
+
+    async def client(index):
+        nonlocal failures
+        while loop.time() < deadline:
+            started = time.perf_counter()
+            try:
+                status = await fetch(port, requests[index % len(requests)])
+            except OSError:
+                status = None
+            latencies.append(time.perf_counter() - started)
+            failures += status != 200
+            index += concurrency
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(index) for index in range(concurrency)))
+    return latencies, failures, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = ('Serves the API with gunicorn (WSGI), with uvicorn running the '
+            'synchronous views and with uvicorn running the async read views '
+            'in turn, with the same number of worker processes, and compares '
+            'throughput and latency of the hot read endpoints under '
+            'concurrent clients. Creates an API token for the benchmark user '
+            'if it has none')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=100,
+            help='Clients sending requests at the same time (default: 100)'
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=10,
+            help='Measured seconds per endpoint and server (default: 10)'
+        )
+        parser.add_argument(
+            '--warmup',
+            type=float,
+            default=1,
+            help='Unmeasured seconds per endpoint and server (default: 1)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=2,
+            help='Worker processes of each server (default: 2)'
+        )
+        parser.add_argument(
+            '--port',
+            type=int,
+            default=8100,
+            help=f'Port the servers listen on at {HOST} (default: 8100)'
+        )
+
+    def servers(self, workers, port):
+        """Name -> (command line, ASYNC_READ_VIEWS)."""
+        gunicorn = [
+            sys.executable, '-m', 'gunicorn', 'foodgram.wsgi:application',
+            '--bind', f'{HOST}:{port}', '--workers', str(workers),
+            '--log-level', 'warning',
+        ]
+        uvicorn = [
+            sys.executable, '-m', 'uvicorn', 'foodgram.asgi:application',
+            '--host', HOST, '--port', str(port), '--workers', str(workers),
+            '--log-level', 'warning', '--no-access-log',
+        ]
+        return {
+            'wsgi': (gunicorn, 'False'),
+            'asgi sync views': (uvicorn, 'False'),
+            'asgi': (uvicorn, 'True'),
+        }
+
+    def endpoints(self, port):
+        """Name -> raw requests the clients take turns sending."""
+        user = (User.objects.filter(shopping_cart__isnull=False,
+                                    follows__isnull=False)
+                .order_by('id').first())
+        recipe_ids = list(
+            Recipe.objects.order_by('-id').values_list('id', flat=True)[:50])
+        if user is None or not recipe_ids:
+            raise CommandError('The database has no data to benchmark, '
+                               'run seed_dataset first.')
+        token, _ = Token.objects.get_or_create(user=user)
+        prefixes = sorted({
+            name[:2] for name in
+            Ingredient.objects.order_by('id').values_list('name', flat=True)
+        })[:20]
+
+        def requests(paths, authenticated=False):
+            headers = f'Host: {HOST}:{port}\r\nConnection: close\r\n'
+            if authenticated:
+                headers += f'Authorization: Token {token.key}\r\n'
+            return [
+                f'GET {path} HTTP/1.1\r\n{headers}\r\n'.encode()
+                for path in paths
+            ]
+
+        pages = [f'/api/recipes/?page={page}' for page in range(1, 21)]
+        return {
+            'recipe_list_anonymous': requests(pages),
+            'recipe_list_authenticated': requests(pages, True),
+            'recipe_detail_authenticated': requests(
+                [f'/api/recipes/{pk}/' for pk in recipe_ids], True),
+            'ingredient_autocomplete': requests(
+                [f'/api/ingredients/?name={quote(prefix)}'
+                 for prefix in prefixes]),
+            'download_shopping_cart': requests(
+                ['/api/recipes/download_shopping_cart/'], True),
+        }
+
+    def start(self, command, async_views, port):
+        env = {**os.environ, 'ASYNC_READ_VIEWS': async_views}
+        process = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f'{command[2]} exited with code '
+                                   f'{process.returncode}.')
+            try:
+                socket.create_connection((HOST, port), timeout=1).close()
+                return process
+            except OSError:
+                time.sleep(0.2)
+        process.terminate()
+        raise CommandError(f'{command[2]} did not start listening on '
+                           f'{HOST}:{port}.')
+
+    def handle(self, *args, **options):
+        for module in ('gunicorn', 'uvicorn'):
+            if find_spec(module) is None:
+                raise CommandError(f'{module} is not installed.')
+        port, concurrency = options['port'], options['concurrency']
+        endpoints = self.endpoints(port)
+        servers = self.servers(options['workers'], port)
+        results = {}
+        for server, (command, async_views) in servers.items():
+            process = self.start(command, async_views, port)
+            try:
+                for name, requests in endpoints.items():
+                    if options['warmup']:
+                        asyncio.run(load(port, requests, concurrency,
+                                         options['warmup']))
+                    results[name, server] = asyncio.run(load(
+                        port, requests, concurrency, options['duration']))
+            finally:
+                process.terminate()
+                process.wait()
+
+        self.stdout.write(
+            f'{"endpoint":<28} {"server":<16} {"req/s":>8} {"p50 ms":>8} '
+            f'{"p95 ms":>8} {"p99 ms":>8} {"failed":>7}'
+        )
+        for name in endpoints:
+            for position, server in enumerate(servers):
+                latencies, failures, elapsed = results[name, server]
+                self.stdout.write(
+                    f'{"" if position else name:<28} {server:<16} '
+                    f'{len(latencies) / elapsed:8.1f} '
+                    f'{percentile(latencies, 0.5) * 1000:8.1f} '
+                    f'{percentile(latencies, 0.95) * 1000:8.1f} '
+                    f'{percentile(latencies, 0.99) * 1000:8.1f} '
+                    f'{failures:>7}'
+                )
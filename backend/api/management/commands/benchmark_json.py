@@ -0,0 +1,68 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from api import renderers
+from api.serializers import IngredientSerializer, RecipeReadSerializer
+from recipes.models import Ingredient, Recipe
+
+
+class Command(BaseCommand):
+    help = ('Compares the render time of FastJSONRenderer and the stdlib '
+            'JSONRenderer on real recipe and ingredient catalog payloads '
+            'and checks that both produce the same bytes')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=100,
+            help='Recipes in the serialized list (default: 100)'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=50,
+            help='Renders per payload and renderer (default: 50)'
+        )
+
+    def payloads(self, recipe_count):
+        request = Request(RequestFactory().get('/api/recipes/'))
+        recipes = (
+            Recipe.objects.select_related('author')
+            .with_user_flags(request.user)[:recipe_count]
+        )
+        return {
+            f'{recipe_count} recipes': RecipeReadSerializer(
+                recipes, many=True, context={'request': request}).data,
+            'ingredient catalog': IngredientSerializer(
+                Ingredient.objects.all(), many=True).data,
+        }
+
+    def measure(self, renderer, data, iterations):
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            body = renderer.render(data)
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings) * 1000, body
+
+    def handle(self, *args, **options):
+        if renderers.orjson is None:
+            raise CommandError('orjson is not installed.')
+        for name, data in self.payloads(options['recipes']).items():
+            stdlib, expected = self.measure(JSONRenderer(), data,
+                                            options['iterations'])
+            fast, body = self.measure(renderers.FastJSONRenderer(), data,
+                                      options['iterations'])
+            if body != expected:
+                raise CommandError(f'{name}: the rendered bytes differ')
+            self.stdout.write(
+                f'{name:<20} {len(body):>9} bytes  '
+                f'stdlib {stdlib:8.2f} ms  orjson {fast:8.2f} ms  '
+                f'x{stdlib / fast:.1f}'
+            )
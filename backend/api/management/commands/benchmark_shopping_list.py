@@ -0,0 +1,128 @@
+import random
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Sum
+from django.http import HttpResponse
+
+from api.exports import shopping_list_response
+from recipes.models import (
+    Ingredient, Recipe, RecipeIngredient, ShoppingCart, ShoppingListItem
+)
+from users.models import User
+
+
+def legacy_download(user):
+    """The previous implementation: the whole list joined in memory."""
+    items = (
+        RecipeIngredient.objects
+        .filter(recipe__in_shopping_cart__user=user)
+        .values(name=F('ingredient__name'),
+                unit=F('ingredient__measurement_unit'))
+        .annotate(total=Sum('amount'))
+        .order_by('name')
+    )
+    lines = [f"{i['name']} ({i['unit']}) — {i['total']}" for i in items]
+    content = '\n'.join(lines) if lines else 'Список пуст.'
+    return HttpResponse(content, content_type='text/plain; charset=utf-8')
+
+
+def streaming_download(user):
+    """What download_shopping_cart serves: the stored aggregate."""
+    return shopping_list_response(
+        ShoppingListItem.objects.for_export(user), 'txt')
+
+
+class Command(BaseCommand):
+    help = ('Compares time-to-first-byte and peak memory of the streaming '
+            'shopping list export against the in-memory one')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=1000,
+            help='Number of recipes in the cart (default: 1000)'
+        )
+        parser.add_argument(
+            '--ingredients',
+            type=int,
+            default=2000,
+            help='Size of the ingredient pool (default: 2000)'
+        )
+        parser.add_argument(
+            '--per-recipe',
+            type=int,
+            default=10,
+            help='Ingredients per recipe (default: 10)'
+        )
+
+    def measure(self, download, user):
+        tracemalloc.start()
+        started = time.perf_counter()
+        response = download(user)
+        if response.streaming:
+            chunks = iter(response.streaming_content)
+            first = next(chunks)
+            first_byte = time.perf_counter() - started
+            size = len(first) + sum(len(chunk) for chunk in chunks)
+        else:
+            first_byte = time.perf_counter() - started
+            size = len(response.content)
+        total = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return first_byte, total, peak, size
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        with transaction.atomic():
+            user = User.objects.create_user(
+                username='shopping-list-benchmark',
+                email='shopping-list-benchmark@example.com',
+                password=None
+            )
+            ingredients = Ingredient.objects.bulk_create(
+                Ingredient(name=f'benchmark ingredient {i}',
+                           measurement_unit='г')
+                for i in range(options['ingredients'])
+            )
+            recipes = Recipe.objects.bulk_create(
+                Recipe(author=user, name=f'benchmark recipe {i}',
+                       text='benchmark', cooking_time=1,
+                       image='recipes/images/benchmark.png')
+                for i in range(options['recipes'])
+            )
+            RecipeIngredient.objects.bulk_create(
+                (RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                  amount=rng.randint(1, 500))
+                 for recipe in recipes
+                 for ingredient in rng.sample(ingredients,
+                                              options['per_recipe'])),
+                batch_size=5000
+            )
+            ShoppingCart.objects.bulk_create(
+                ShoppingCart(user=user, recipe=recipe) for recipe in recipes
+            )
+            # bulk_create sends no signals, so the user's list is filled
+            # from the carts here.
+            ShoppingListItem.objects.bulk_create(
+                ShoppingListItem(user=user,
+                                 ingredient_id=item['ingredient_id'],
+                                 total=item['live_total'])
+                for item in ShoppingListItem.objects.live_totals()
+                .filter(user_id=user.id)
+            )
+
+            for name, download in (('in-memory', legacy_download),
+                                   ('streaming', streaming_download)):
+                first_byte, total, peak, size = self.measure(download, user)
+                self.stdout.write(
+                    f'{name:>10}: first byte {first_byte * 1000:8.1f} ms, '
+                    f'total {total * 1000:8.1f} ms, '
+                    f'peak Python memory {peak / 1024:8.1f} KiB, '
+                    f'{size} bytes'
+                )
+            transaction.set_rollback(True)
@@ -0,0 +1,93 @@
+from contextlib import ExitStack
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.test import Client, RequestFactory
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment
+)
+from rest_framework.authtoken.models import Token
+
+from api.replica import REPLICA, client_key, replica_configured
+from recipes.models import Recipe
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ('Sends API requests through the replica router and checks which '
+            'database serves them: reads go to the replica, writes and the '
+            'reads of the writing client right after them to the primary; '
+            'all writes are rolled back')
+
+    def queries(self, request):
+        """Queries per database alias sent by ``request``."""
+        with ExitStack() as stack:
+            contexts = {
+                alias: stack.enter_context(
+                    CaptureQueriesContext(connections[alias]))
+                for alias in (DEFAULT_DB_ALIAS, REPLICA)
+            }
+            response = request()
+        if response.status_code >= 400:
+            raise CommandError(f'{response.status_code}: {response.content}')
+        return {alias: len(context) for alias, context in contexts.items()}
+
+    def scenario(self, client):
+        """Step -> (request, alias that should serve its reads)."""
+        writer, reader = User.objects.order_by('id')[:2]
+        recipe = Recipe.objects.exclude(favorited_by__user=writer).first()
+        if recipe is None:
+            raise CommandError('The database has no data to check, '
+                               'run seed_dataset first.')
+        auth = {}
+        for user in (writer, reader):
+            token, _ = Token.objects.get_or_create(user=user)
+            auth[user] = {'HTTP_AUTHORIZATION': f'Token {token.key}'}
+        self.pins = [client_key(RequestFactory().get('/', **headers))
+                     for headers in auth.values()]
+        # A pin left by real use would route everything to the primary.
+        cache.delete_many(self.pins)
+
+        def get(user):
+            return lambda: client.get('/api/recipes/', **auth[user])
+
+        return [
+            ('list before the write', get(writer), REPLICA),
+            ('add to favorites', lambda: client.post(
+                f'/api/recipes/{recipe.pk}/favorite/', **auth[writer]),
+             DEFAULT_DB_ALIAS),
+            ('list right after the write', get(writer), DEFAULT_DB_ALIAS),
+            ('list of another user', get(reader), REPLICA),
+        ]
+
+    def handle(self, *args, **options):
+        if not replica_configured():
+            raise CommandError('No replica database is configured, set '
+                               'DB_REPLICA_HOST or DB_REPLICA_NAME.')
+        setup_test_environment()
+        client = Client()
+        failed = False
+        # The anonymous response cache reads the primary on misses.
+        with override_settings(RESPONSE_CACHE_TIMEOUT=0), \
+                transaction.atomic():
+            try:
+                for step, request, expected in self.scenario(client):
+                    counts = self.queries(request)
+                    # The token lookup always goes to the primary.
+                    ok = (counts[REPLICA] > 0
+                          and counts[DEFAULT_DB_ALIAS] <= 1
+                          if expected == REPLICA
+                          else counts[REPLICA] == 0)
+                    failed |= not ok
+                    self.stdout.write(
+                        f'{step:<28} primary {counts[DEFAULT_DB_ALIAS]:>3}  '
+                        f'replica {counts[REPLICA]:>3}  '
+                        f'{"ok" if ok else "expected " + expected}'
+                    )
+            finally:
+                transaction.set_rollback(True)
+                cache.delete_many(self.pins)
+        if failed:
+            raise CommandError('Reads are not routed as expected.')
+        self.stdout.write('Reads are routed as expected')
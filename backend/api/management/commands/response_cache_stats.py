@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.cache import (
+    HIT, MISS, reset_response_cache_stats, response_cache_stats
+)
+
+
+class Command(BaseCommand):
+    help = ('Shows the hits and misses of the anonymous recipe response '
+            'cache; only meaningful with a shared cache backend')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Zero the counters after printing them'
+        )
+
+    def handle(self, *args, **options):
+        if not settings.SHARED_CACHE:
+            self.stderr.write('Outcomes are only counted with a shared '
+                              'cache backend (CACHE_BACKEND).')
+        stats = response_cache_stats()
+        total = stats[HIT] + stats[MISS]
+        ratio = stats[HIT] / total if total else 0
+        self.stdout.write(f'hits {stats[HIT]}  misses {stats[MISS]}  '
+                          f'hit ratio {ratio:.1%}')
+        if options['reset']:
+            reset_response_cache_stats()
@@ -0,0 +1,152 @@
+import logging
+import re
+import sys
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from rest_framework.fields import Field
+from rest_framework.permissions import SAFE_METHODS
+
+from api.replica import (
+    RoutingState, ais_pinned, apin, client_key, is_pinned, pin, routing
+)
+
+logger = logging.getLogger('api.sql')
+
+PLACEHOLDER_LIST = re.compile(r'\((?:%s, )+%s\)')
+
+
+def query_shape(sql):
+    """SQL with placeholder lists of any length collapsed into one."""
+    return PLACEHOLDER_LIST.sub('(%s, ...)', sql)
+
+
+def serializer_field():
+    """Name of the innermost serializer field on the current stack."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        field = frame.f_locals.get('self')
+        if isinstance(field, Field) and field.field_name:
+            return f'{type(field.parent).__name__}.{field.field_name}'
+        frame = frame.f_back
+    return None
+
+
+class QueryCollector:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+        self.suspects = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            shape = query_shape(sql)
+            self.shapes[shape] += 1
+            if self.shapes[shape] == settings.N_PLUS_ONE_THRESHOLD:
+                self.suspects[shape] = serializer_field()
+
+
+class QueryInstrumentationMiddleware:
+    """Count the queries of a request and flag likely N+1 patterns.
+
+    The number of queries and the time spent in the database go to the
+    ``Server-Timing`` header and to the ``api.sql`` log. A query shape
+    repeated N_PLUS_ONE_THRESHOLD times within one request is logged as
+    an N+1 suspect along with the serializer field that issued it.
+    Queries of streamed response bodies run after the view returns and
+    are not counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        collector = QueryCollector()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(collector))
+            response = self.get_response(request)
+
+        duration = collector.duration * 1000
+        response['Server-Timing'] = (
+            f'db;desc="{collector.count} queries";dur={duration:.1f}')
+        suspects = [
+            {'sql': shape, 'count': collector.shapes[shape], 'field': field}
+            for shape, field in collector.suspects.items()
+        ]
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': collector.count,
+            'db_time_ms': round(duration, 1),
+            'n_plus_one': suspects,
+        }
+        logger.info('%s %s: %d queries in %.1f ms', request.method,
+                    request.path, collector.count, duration, extra=fields)
+        for suspect in suspects:
+            logger.warning('N+1 suspect in %s %s from %s (%d times): %s',
+                           request.method, request.path, suspect['field'],
+                           suspect['count'], suspect['sql'], extra=fields)
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """Send the reads of safe API requests to the read replica.
+
+    Requests of a client that wrote within REPLICA_STICKY_SECONDS keep
+    reading from the primary; see api.replica. Async-capable, so that
+    async views are not pushed through a thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        client = client_key(request)
+        state = self.routing_state(request, is_pinned(client))
+        token = routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            routing.reset(token)
+        if state.wrote:
+            pin(client)
+        return response
+
+    async def __acall__(self, request):
+        client = client_key(request)
+        state = self.routing_state(request, await ais_pinned(client))
+        token = routing.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            routing.reset(token)
+        if state.wrote:
+            await apin(client)
+        return response
+
+    @staticmethod
+    def routing_state(request, pinned):
+        return RoutingState(
+            request.method in SAFE_METHODS
+            and request.path.startswith('/api/')
+            and not pinned
+        )
@@ -1,4 +1,6 @@
-from rest_framework.pagination import PageNumberPagination
+from django.core.paginator import InvalidPage
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 from foodgram.const import DEFAULT_PAGE_SIZE
 
@@ -6,3 +8,59 @@ from foodgram.const import DEFAULT_PAGE_SIZE
 class PageNumberPaginationWithLimit(PageNumberPagination):
     page_size = DEFAULT_PAGE_SIZE
     page_size_query_param = 'limit'
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Keyset pagination on pub_date.
+
+    DRF keys the cursor on the first ordering field only: ``-id`` keeps
+    the order stable, but recipes that share a pub_date are stepped over
+    by an offset within that pub_date. A row inserted among them between
+    two requests can shift such a page by one.
+    """
+
+    page_size = DEFAULT_PAGE_SIZE
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
+
+
+class RecipePagination(PageNumberPaginationWithLimit):
+    """Page number pagination with opt-in keyset mode.
+
+    Requests carrying the ``cursor`` query parameter (an empty value
+    starts from the first page) are paginated by pub_date without
+    COUNT(*) (see RecipeCursorPagination for ties); all other requests
+    keep the ``page``/``limit`` contract.
+    """
+
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param in request.query_params:
+            self.cursor_paginator = RecipeCursorPagination()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        self.cursor_paginator = None
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request):
+        """paginate_queryset() for async views, page number mode only."""
+        self.cursor_paginator = None
+        self.request = request
+        paginator = self.django_paginator_class(
+            queryset, self.get_page_size(request))
+        # The cached property would run a synchronous COUNT(*).
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)))
+        return [item async for item in self.page.object_list]
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,72 @@
+import re
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# U+2028 and U+2029 in UTF-8, escaped like JSONRenderer does.
+LINE_SEPARATORS = re.compile(rb'\xe2\x80[\xa8\xa9]')
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer that encodes with orjson when it is installed.
+
+    The bytes are the same as the stdlib encoder produces with the
+    compact separators and ``ensure_ascii=False`` (UNICODE_JSON), so
+    Cyrillic stays raw UTF-8 and U+2028/U+2029 are escaped. Indented or
+    ASCII-only output and values orjson cannot encode (e.g. integers
+    wider than 64 bits or non-string keys) go through JSONRenderer.
+    Values orjson does not know, datetimes included, are encoded by
+    ``encoder_class``.
+
+    The one difference is the notation of floats below 1e-4 or from 1e16
+    in absolute value (and NaN, written as null); no API field returns
+    floats, and benchmark_json compares the output on real payloads.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.ensure_ascii
+                or not self.compact
+                or self.get_indent(accepted_media_type,
+                                   renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default,
+                               option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        return LINE_SEPARATORS.sub(
+            lambda match: match[0].decode().encode('unicode_escape'), ret)
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Declares a shopping list export format for content negotiation.
+
+    The list itself is streamed by the view, so only error payloads
+    (e.g. 401) are ever rendered here.
+    """
+
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return JSONRenderer().render(data)
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class PDFShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
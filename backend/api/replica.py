@@ -0,0 +1,115 @@
+"""Routing of API reads to the optional read replica.
+
+ReplicaRoutingMiddleware marks safe API requests as replica readers;
+ReplicaRouter then sends their reads to the ``replica`` database and
+every write to ``default``. A request that writes reads from the primary
+from then on, and its client (by credentials) stays on the primary for
+REPLICA_STICKY_SECONDS, so users see their own changes while the replica
+catches up. Code outside of requests always uses the primary.
+"""
+import hashlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA = 'replica'
+
+# Read right after they are created (log in) or deleted (log out).
+PRIMARY_MODELS = {'authtoken.token', 'sessions.session'}
+
+routing = ContextVar('replica_routing', default=None)
+
+
+class RoutingState:
+    def __init__(self, replica):
+        self.replica = replica
+        self.wrote = False
+        self.primary_blocks = 0
+
+    @property
+    def read_alias(self):
+        if self.replica and not self.wrote and not self.primary_blocks:
+            return REPLICA
+        return DEFAULT_DB_ALIAS
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+@contextmanager
+def primary_reads():
+    """Read from the primary within the block.
+
+    For results that outlive the request, such as cache entries stored
+    under a fresh version token, which must not hold lagging data.
+    """
+    state = routing.get()
+    if state is None:
+        yield
+        return
+    state.primary_blocks += 1
+    try:
+        yield
+    finally:
+        state.primary_blocks -= 1
+
+
+# ─────────────────────────────────────────────────────────────
+#                  READ-YOUR-WRITES PINNING
+# ─────────────────────────────────────────────────────────────
+
+def client_key(request):
+    """Cache key of the client by its token or session, if it has one."""
+    credentials = (request.META.get('HTTP_AUTHORIZATION')
+                   or request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+    if not credentials:
+        return None
+    digest = hashlib.md5(credentials.encode(), usedforsecurity=False)
+    return f'replica:pinned:{digest.hexdigest()}'
+
+
+def is_pinned(key):
+    return key is not None and cache.get(key) is not None
+
+
+async def ais_pinned(key):
+    return key is not None and await cache.aget(key) is not None
+
+
+def pin(key):
+    if key is not None:
+        cache.set(key, 1, settings.REPLICA_STICKY_SECONDS)
+
+
+async def apin(key):
+    if key is not None:
+        await cache.aset(key, 1, settings.REPLICA_STICKY_SECONDS)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = routing.get()
+        if state is None or model._meta.label_lower in PRIMARY_MODELS:
+            return DEFAULT_DB_ALIAS
+        return state.read_alias
+
+    def db_for_write(self, model, **hints):
+        state = routing.get()
+        if state is not None:
+            state.wrote = True
+        # Explicitly: objects read from the replica are saved to it
+        # otherwise.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both databases hold the same data.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == REPLICA:
+            return False
+        return None
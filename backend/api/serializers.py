@@ -1,14 +1,20 @@
 import base64
 import imghdr
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
 from django.core.files.base import ContentFile
-from django.db import transaction
+from django.db import models, transaction
+from django.db.models import prefetch_related_objects
 from rest_framework import serializers
 
+from api.cache import recipe_fragment_key
+from foodgram.const import RECIPE_IMAGE_VARIANTS
 from users.models import User, Follow
 from recipes.models import (
     Tag, Ingredient, Recipe, RecipeIngredient,
-    Favorite, ShoppingCart
+    Favorite, ShoppingCart, ShoppingListItem
 )
 
 
@@ -26,6 +32,59 @@ class Base64ImageField(serializers.ImageField):
         return super().to_internal_value(data)
 
 
+class ImageVariantsField(serializers.Field):
+    """URLs of the resized copies of a recipe image.
+
+    Until the worker pool has rendered them every entry points at the
+    original image.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        if not recipe.image:
+            return None
+        request = self.context.get('request')
+        storage = recipe.image.storage
+        ready = recipe.image_variants_ready
+
+        def url(name):
+            url = storage.url(name)
+            return request.build_absolute_uri(url) if request else url
+
+        return {
+            variant: {
+                key: url(recipe.image_variants[variant][key]
+                         if ready else recipe.image.name)
+                for key in ('src', 'webp')
+            }
+            for variant in RECIPE_IMAGE_VARIANTS
+        }
+
+
+def resolve_ids(model, ids, message):
+    """Fetch the objects for ``ids`` with one query, keeping the order."""
+    objects = model.objects.in_bulk(set(ids))
+    missing = sorted(set(ids) - objects.keys())
+    if missing:
+        raise serializers.ValidationError(
+            f'{message}: {", ".join(map(str, missing))}.')
+    return [objects[pk] for pk in ids]
+
+
+def get_followed_author_ids(request):
+    """Ids of the authors the requesting user follows, loaded once."""
+    if not hasattr(request, '_followed_author_ids'):
+        request._followed_author_ids = set(
+            Follow.objects.filter(user=request.user)
+            .values_list('author_id', flat=True)
+        )
+    return request._followed_author_ids
+
+
 # ─────────────────────────────────────────────────────────────
 #                         USERS
 # ─────────────────────────────────────────────────────────────
@@ -44,7 +103,7 @@ class UserSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         return bool(
             request and request.user.is_authenticated
-            and Follow.objects.filter(user=request.user, author=obj).exists()
+            and obj.id in get_followed_author_ids(request)
         )
 
 
@@ -62,9 +121,11 @@ class RegisterUserSerializer(serializers.ModelSerializer):
 # ─────────────────────────────────────────────────────────────
 
 class RecipeMinSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
 
 
 class SubscriptionSerializer(UserSerializer):
@@ -77,9 +138,13 @@ class SubscriptionSerializer(UserSerializer):
         )
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.recipes.count()
 
     def get_recipes(self, obj):
+        if hasattr(obj, 'limited_recipes'):
+            return RecipeMinSerializer(obj.limited_recipes, many=True).data
         request = self.context.get('request')
         limit = request.query_params.get('recipes_limit')
         recipes = obj.recipes.all()
@@ -133,10 +198,8 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 
 class IngredientInRecipeWriteSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(),
-        source='ingredient'
-    )
+    # Resolved for the whole recipe at once in RecipeWriteSerializer.
+    id = serializers.IntegerField()
 
     class Meta:
         model = RecipeIngredient
@@ -159,7 +222,26 @@ class IngredientInRecipeReadSerializer(serializers.ModelSerializer):
 #                         RECIPES
 # ─────────────────────────────────────────────────────────────
 
+RECIPE_USER_FLAGS = ('is_favorited', 'is_in_shopping_cart')
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        if isinstance(data, models.manager.BaseManager):
+            data = data.all()
+        return self.child.represent(list(data))
+
+
 class RecipeReadSerializer(serializers.ModelSerializer):
+    """Recipe as seen by the requesting user.
+
+    Everything but ``is_favorited``, ``is_in_shopping_cart`` and
+    ``author.is_subscribed`` is the same for every user, so it is cached
+    per recipe for RECIPE_FRAGMENT_TIMEOUT seconds, keyed by updated_at.
+    Only recipes missing from the cache get their tags and ingredients
+    prefetched and serialized; the per-user flags are merged in after.
+    """
+
     tags = TagSerializer(many=True)
     author = UserSerializer(read_only=True)
     ingredients = IngredientInRecipeReadSerializer(
@@ -167,6 +249,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         many=True
     )
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -175,10 +258,100 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         fields = (
             'id', 'tags', 'author', 'ingredients',
             'is_favorited', 'is_in_shopping_cart',
-            'name', 'image', 'text', 'cooking_time'
+            'name', 'image', 'image_variants', 'text', 'cooking_time'
         )
+        list_serializer_class = RecipeListSerializer
+
+    def to_representation(self, instance):
+        return self.represent([instance])[0]
+
+    def represent(self, recipes):
+        keys, fragments = self.cached_fragments(recipes)
+        missing = [recipe for recipe in recipes
+                   if keys[recipe.pk] not in fragments]
+        if missing:
+            fragments.update(self.build_fragments(missing, keys))
+        return [self.personalize(fragments[keys[recipe.pk]], recipe)
+                for recipe in recipes]
+
+    async def arepresent(self, recipes):
+        """represent() for async views.
+
+        The followed authors and the cached fragments are loaded with the
+        async ORM and cache API; the recipes missing from the cache are
+        built in a worker thread.
+        """
+        request = self.context.get('request')
+        if (request and request.user.is_authenticated
+                and not hasattr(request, '_followed_author_ids')):
+            request._followed_author_ids = {
+                author_id async for author_id in
+                Follow.objects.filter(user=request.user)
+                .values_list('author_id', flat=True)
+            }
+        keys = self.fragment_keys(recipes)
+        fragments = {}
+        if settings.RECIPE_FRAGMENT_TIMEOUT:
+            fragments = await cache.aget_many(keys.values())
+        missing = [recipe for recipe in recipes
+                   if keys[recipe.pk] not in fragments]
+        if missing:
+            fragments.update(
+                await sync_to_async(self.build_fragments)(missing, keys))
+        return [self.personalize(fragments[keys[recipe.pk]], recipe)
+                for recipe in recipes]
+
+    def fragment_keys(self, recipes):
+        """Fragment keys by recipe id."""
+        request = self.context.get('request')
+        base_url = request.build_absolute_uri('/') if request else ''
+        return {recipe.pk: recipe_fragment_key(recipe, base_url)
+                for recipe in recipes}
+
+    def cached_fragments(self, recipes):
+        """Fragment keys by recipe id and the fragments found in the cache."""
+        keys = self.fragment_keys(recipes)
+        if not settings.RECIPE_FRAGMENT_TIMEOUT:
+            return keys, {}
+        return keys, cache.get_many(keys.values())
+
+    def build_fragments(self, recipes, keys):
+        prefetch_related_objects(
+            recipes, 'tags', 'recipe_ingredients__ingredient')
+        built = {keys[recipe.pk]: self.fragment(recipe) for recipe in recipes}
+        if settings.RECIPE_FRAGMENT_TIMEOUT:
+            cache.set_many(built, settings.RECIPE_FRAGMENT_TIMEOUT)
+        return built
+
+    def fragment(self, recipe):
+        fragment = {}
+        for field in self._readable_fields:
+            if field.field_name in RECIPE_USER_FLAGS:
+                continue
+            attribute = field.get_attribute(recipe)
+            fragment[field.field_name] = (
+                None if attribute is None
+                else field.to_representation(attribute)
+            )
+        return fragment
+
+    def personalize(self, fragment, recipe):
+        request = self.context.get('request')
+        flags = {
+            'is_favorited': self.get_is_favorited(recipe),
+            'is_in_shopping_cart': self.get_is_in_shopping_cart(recipe),
+        }
+        data = {name: flags[name] if name in flags else fragment[name]
+                for name in self.Meta.fields}
+        data['author'] = {**fragment['author'], 'is_subscribed': bool(
+            request and request.user.is_authenticated
+            and recipe.author_id in get_followed_author_ids(request)
+        )}
+        return data
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         return bool(
             request and request.user.is_authenticated
@@ -186,6 +359,8 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         )
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         return bool(
             request and request.user.is_authenticated
@@ -195,10 +370,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
 
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True
-    )
+    tags = serializers.ListField(child=serializers.IntegerField())
     ingredients = IngredientInRecipeWriteSerializer(many=True)
     image = Base64ImageField()
 
@@ -209,30 +381,45 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             'tags', 'ingredients'
         )
 
+    def validate_tags(self, tags):
+        return resolve_ids(Tag, tags, 'Несуществующие теги')
+
+    def validate_ingredients(self, items):
+        ingredients = resolve_ids(
+            Ingredient, [item['id'] for item in items],
+            'Несуществующие ингредиенты'
+        )
+        return [
+            {'ingredient': ingredient, 'amount': item['amount']}
+            for ingredient, item in zip(ingredients, items)
+        ]
+
     def validate(self, data):
-        ingredients = data.get('ingredients')
-        tags = data.get('tags')
-
-        if not ingredients:
-            raise serializers.ValidationError({
-                'ingredients': 'Нужен хотя бы один ингредиент.'
-            })
-
-        if len({item['ingredient'].id for item
-                in ingredients}) != len(ingredients):
-            raise serializers.ValidationError({
-                'ingredients': 'Ингредиенты не должны повторяться.'
-            })
-
-        if not tags:
-            raise serializers.ValidationError({
-                'tags': 'Нужен хотя бы один тег.'
-            })
-
-        if len(set(tags)) != len(tags):
-            raise serializers.ValidationError({
-                'tags': 'Теги не должны повторяться.'
-            })
+        # A partial update only checks the fields it carries.
+        if not self.partial or 'ingredients' in data:
+            ingredients = data.get('ingredients')
+            if not ingredients:
+                raise serializers.ValidationError({
+                    'ingredients': 'Нужен хотя бы один ингредиент.'
+                })
+
+            if len({item['ingredient'].id for item
+                    in ingredients}) != len(ingredients):
+                raise serializers.ValidationError({
+                    'ingredients': 'Ингредиенты не должны повторяться.'
+                })
+
+        if not self.partial or 'tags' in data:
+            tags = data.get('tags')
+            if not tags:
+                raise serializers.ValidationError({
+                    'tags': 'Нужен хотя бы один тег.'
+                })
+
+            if len(set(tags)) != len(tags):
+                raise serializers.ValidationError({
+                    'tags': 'Теги не должны повторяться.'
+                })
 
         return data
 
@@ -249,6 +436,41 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         ]
         RecipeIngredient.objects.bulk_create(objs)
 
+    @staticmethod
+    def _update_ingredients(recipe, ingredients):
+        """Write only the rows that differ from the stored ingredients."""
+        # Read again under lock: the prefetched rows may predate a
+        # concurrent edit and would give the shopping lists wrong deltas.
+        current = {
+            item.ingredient_id: item
+            for item in RecipeIngredient.objects.select_for_update()
+            .filter(recipe=recipe)
+        }
+        new_amounts = {item['ingredient'].id: item['amount']
+                       for item in ingredients}
+        # Deleted rows leave the shopping lists through api.signals; the
+        # bulk writes below send no signals and are applied here.
+        kept_amounts = {pk: item.amount for pk, item in current.items()
+                        if pk in new_amounts}
+
+        removed = [item.id for pk, item in current.items()
+                   if pk not in new_amounts]
+        if removed:
+            RecipeIngredient.objects.filter(id__in=removed).delete()
+        changed = []
+        for pk, amount in new_amounts.items():
+            if pk in current and current[pk].amount != amount:
+                current[pk].amount = amount
+                changed.append(current[pk])
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient_id=pk, amount=amount)
+            for pk, amount in new_amounts.items() if pk not in current
+        )
+        ShoppingListItem.objects.change_recipe(
+            recipe.id, kept_amounts, new_amounts)
+
     @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
@@ -260,17 +482,24 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
-
-        instance = super().update(instance, validated_data)
-        instance.tags.set(tags)
-        instance.recipe_ingredients.all().delete()
-        self._set_m2m(instance, instance.tags.all(), ingredients)
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
+
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save_content()
+        # set() only adds and removes the links that actually changed.
+        if tags is not None:
+            instance.tags.set(tags)
+        if ingredients is not None:
+            self._update_ingredients(instance, ingredients)
 
         return instance
 
     def to_representation(self, instance):
+        # Caches filled before the write are dropped by the view.
+        prefetch_related_objects(
+            [instance], 'tags', 'recipe_ingredients__ingredient')
         return RecipeReadSerializer(instance, context=self.context).data
 
 
@@ -295,6 +524,12 @@ class FavoriteSerializer(serializers.ModelSerializer):
         attrs['user'] = user
         return attrs
 
+    @transaction.atomic
+    def create(self, validated_data):
+        # Recipe.favorites_count is updated by a post_save receiver and
+        # has to be committed together with the favorite row.
+        return super().create(validated_data)
+
     def to_representation(self, instance):
         return RecipeMinSerializer(
             instance.recipe,
@@ -319,6 +554,13 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
         attrs['user'] = user
         return attrs
 
+    @transaction.atomic
+    def create(self, validated_data):
+        # Recipe.in_cart_count and the shopping list aggregate are updated
+        # by a post_save receiver and have to be committed together with
+        # the cart row.
+        return super().create(validated_data)
+
     def to_representation(self, instance):
         return RecipeMinSerializer(
             instance.recipe,
@@ -0,0 +1,284 @@
+import weakref
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, QuerySet
+from django.db.models.functions import Greatest
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from api.cache import (
+    RECIPE, RECIPES, USER, USERS, bump_version, bump_versions
+)
+from api.catalog import INGREDIENTS, TAGS
+from recipes.images import release_variants, schedule_variants, variants_ready
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+    ShoppingListItem, Tag, bulk_changed
+)
+from users.models import Follow, User
+
+
+def change_counter(recipe_id, field, delta):
+    # Clamped so that a drifted counter at 0 does not make the positive
+    # field reject the decrement; recount_recipe_counters repairs it.
+    Recipe.objects.filter(pk=recipe_id).update(
+        **{field: Greatest(F(field) + delta, 0)})
+
+
+def touch_recipes(**filters):
+    Recipe.objects.filter(**filters).update(updated_at=timezone.now())
+
+
+# Bumps waiting for their transaction to commit, per connection: recipe
+# id to a weak reference to the callback. Django drops the callbacks of
+# rolled back transactions and savepoints, which kills the reference.
+_pending_bumps = weakref.WeakKeyDictionary()
+
+
+def bump_recipe_on_commit(recipe_id):
+    """Bump the versions of a recipe once the transaction commits.
+
+    Returns False if that is already pending.
+    """
+    pending = _pending_bumps.setdefault(transaction.get_connection(), {})
+    callback = pending.get(recipe_id)
+    if callback is not None and callback() is not None:
+        return False
+
+    def bump():
+        pending.pop(recipe_id, None)
+        bump_versions(RECIPES, RECIPE.format(pk=recipe_id))
+
+    pending[recipe_id] = weakref.ref(bump)
+    transaction.on_commit(bump)
+    return True
+
+
+def invalidate_recipe_content(recipe_id):
+    """Move updated_at of a recipe whose links changed and bump it.
+
+    Once per transaction: a save of the recipe in the same transaction,
+    as through the API or the admin, already covers every link written
+    with it.
+    """
+    if bump_recipe_on_commit(recipe_id):
+        touch_recipes(pk=recipe_id)
+
+
+@receiver([post_save, post_delete, bulk_changed], sender=Ingredient)
+def invalidate_ingredients(**kwargs):
+    transaction.on_commit(lambda: bump_version(INGREDIENTS))
+
+
+@receiver([post_save, post_delete, bulk_changed], sender=Tag)
+def invalidate_tags(**kwargs):
+    transaction.on_commit(lambda: bump_version(TAGS))
+
+
+# Tags and ingredients are embedded in the recipes that use them, so
+# changes of either, and of the links to them, move updated_at of those
+# recipes.
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def touch_tag_recipes(instance, created=False, **kwargs):
+    if not created:
+        touch_recipes(tags=instance)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Ingredient)
+def touch_ingredient_recipes(instance, created=False, **kwargs):
+    if not created:
+        touch_recipes(recipe_ingredients__ingredient=instance)
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def invalidate_recipe(instance, **kwargs):
+    bump_recipe_on_commit(instance.pk)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def invalidate_saved_recipe_ingredient(instance, raw, **kwargs):
+    if not raw:
+        invalidate_recipe_content(instance.recipe_id)
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def invalidate_deleted_recipe_ingredient(instance, origin, **kwargs):
+    # Rows deleted with their recipe or ingredient are covered by the
+    # receivers of those.
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if model is RecipeIngredient:
+        invalidate_recipe_content(instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove') and pk_set:
+        recipe_ids = pk_set if reverse else [instance.pk]
+    elif action == 'pre_clear':
+        recipe_ids = (instance.recipes.values_list('pk', flat=True)
+                      if reverse else [instance.pk])
+    else:
+        return
+    for recipe_id in recipe_ids:
+        invalidate_recipe_content(recipe_id)
+
+
+@receiver(bulk_changed, sender=Recipe)
+def invalidate_recipe_list(**kwargs):
+    transaction.on_commit(lambda: bump_version(RECIPES))
+
+
+@receiver(variants_ready, sender=Recipe)
+def invalidate_recipe_images(recipe_id, **kwargs):
+    bump_versions(RECIPES, RECIPE.format(pk=recipe_id))
+
+
+@receiver(post_save, sender=User)
+def invalidate_users(instance, created, update_fields, **kwargs):
+    if not created and update_fields != {'last_login'}:
+        touch_recipes(author=instance)
+        transaction.on_commit(lambda: bump_version(USERS))
+
+
+@receiver(bulk_changed, sender=User)
+def invalidate_all_users(**kwargs):
+    transaction.on_commit(lambda: bump_version(USERS))
+
+
+@receiver([post_save, post_delete], sender=Favorite)
+@receiver([post_save, post_delete], sender=ShoppingCart)
+@receiver([post_save, post_delete], sender=Follow)
+def invalidate_user_flags(instance, **kwargs):
+    name = USER.format(pk=instance.user_id)
+    transaction.on_commit(lambda: bump_version(name))
+
+
+@receiver(pre_save, sender=Recipe)
+def release_replaced_image(instance, raw, update_fields, **kwargs):
+    if (raw or instance.pk is None
+            or update_fields is not None and 'image' not in update_fields):
+        return
+    # Only recipes built with a primary key, or loaded without their
+    # image, are read here.
+    if hasattr(instance, 'stored_image'):
+        previous = instance.stored_image
+    else:
+        previous = Recipe.objects.filter(pk=instance.pk).values_list(
+            'image', flat=True).first()
+    if previous and previous != instance.image.name:
+        instance.image.storage.delete(previous)
+
+
+# After the save, when an uploaded image has its content-addressed name.
+@receiver(post_save, sender=Recipe)
+def remember_stored_image(instance, raw, update_fields, **kwargs):
+    if not raw and (update_fields is None or 'image' in update_fields):
+        instance.stored_image = instance.image.name
+
+
+@receiver(post_delete, sender=Recipe)
+def release_images(instance, **kwargs):
+    if instance.image:
+        instance.image.storage.delete(instance.image.name)
+        release_variants(instance.image.storage, instance.image_variants)
+
+
+@receiver(post_save, sender=Recipe)
+def render_image_variants(instance, raw, **kwargs):
+    if not raw and instance.image and not instance.image_variants_ready:
+        schedule_variants(instance.pk)
+
+
+@receiver(post_save, sender=Favorite)
+def count_favorite(instance, created, raw, **kwargs):
+    if created and not raw:
+        change_counter(instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(pre_delete, sender=Favorite)
+def uncount_favorite(instance, **kwargs):
+    change_counter(instance.recipe_id, 'favorites_count', -1)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(instance, created, raw, **kwargs):
+    if created and not raw:
+        change_counter(instance.recipe_id, 'in_cart_count', 1)
+        ShoppingListItem.objects.add_recipe(instance.user_id,
+                                            instance.recipe_id)
+
+
+# pre_delete runs inside the deletion transaction and before cascades
+# remove the recipe's ingredients, which are needed for the amounts.
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_list(instance, **kwargs):
+    change_counter(instance.recipe_id, 'in_cart_count', -1)
+    ShoppingListItem.objects.remove_recipe(instance.user_id,
+                                           instance.recipe_id)
+
+
+def change_shopping_lists(old_rows, new_rows):
+    """Move the lists of the users who carted the recipes of the given
+    (recipe_id, ingredient_id, amount) rows from the old to the new ones.
+    """
+    amounts = defaultdict(lambda: ({}, {}))
+    for index, rows in enumerate((old_rows, new_rows)):
+        for recipe_id, ingredient_id, amount in rows:
+            amounts[recipe_id][index][ingredient_id] = amount
+    for recipe_id, (old_amounts, new_amounts) in amounts.items():
+        ShoppingListItem.objects.change_recipe(recipe_id, old_amounts,
+                                               new_amounts)
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+def read_stored_recipe_ingredient(instance, raw, **kwargs):
+    # Rows loaded from the database remember themselves; only rows built
+    # with a primary key, or with a deferred amount, are read here.
+    stored_row = getattr(instance, 'stored_row', None)
+    if (not raw and instance.pk is not None
+            and (stored_row is None or stored_row[2] is None)):
+        instance.stored_row = RecipeIngredient.objects.filter(
+            pk=instance.pk).values_list(
+            'recipe_id', 'ingredient_id', 'amount').first()
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def save_recipe_ingredient_to_shopping_lists(instance, created, raw,
+                                             **kwargs):
+    if raw:
+        return
+    old_row = None if created else getattr(instance, 'stored_row', None)
+    instance.remember_stored_row()
+    if old_row != instance.stored_row:
+        change_shopping_lists([old_row] if old_row else [],
+                              [instance.stored_row])
+
+
+# Querysets whose rows have already been taken off the shopping lists.
+_deleted_querysets = weakref.WeakSet()
+
+
+@receiver(pre_delete, sender=RecipeIngredient)
+def delete_recipe_ingredient_from_shopping_lists(instance, origin, **kwargs):
+    # Rows deleted with their recipe leave the lists through its cart
+    # rows, and those deleted with their ingredient take its list rows
+    # along. A queryset delete is applied at its first row, in one go.
+    if isinstance(origin, RecipeIngredient):
+        rows = RecipeIngredient.objects.filter(pk=instance.pk)
+    elif (isinstance(origin, QuerySet) and origin.model is RecipeIngredient
+            and origin not in _deleted_querysets):
+        _deleted_querysets.add(origin)
+        rows = origin
+    else:
+        return
+    change_shopping_lists(
+        rows.select_for_update().values_list(
+            'recipe_id', 'ingredient_id', 'amount'),
+        []
+    )
@@ -0,0 +1,647 @@
+import base64
+import io
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+from django.http import QueryDict
+from django.test import (
+    AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase,
+    TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api import async_views
+from api.catalog import tag_slugs
+from api.filters import RecipeFilter
+from api.middleware import ReplicaRoutingMiddleware
+from api.replica import (
+    REPLICA, ReplicaRouter, RoutingState, ais_pinned, client_key,
+    primary_reads, routing
+)
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+    ShoppingListItem, Tag
+)
+from foodgram.const import RECIPE_IMAGE_VARIANTS
+from users.models import User
+
+RECIPE_COUNT = 12
+INGREDIENT_COUNT = 50
+
+
+def create_user(index):
+    return User.objects.create_user(
+        email=f'user{index}@example.com', username=f'user{index}',
+        first_name='Имя', last_name='Фамилия', password='password'
+    )
+
+
+def create_recipe(author):
+    """A recipe whose image variants count as rendered, so that no commit
+    schedules them."""
+    image = 'recipes/images/recipe.png'
+    return Recipe.objects.create(
+        author=author, name='Рецепт', text='Текст', cooking_time=10,
+        image=image,
+        image_variants={
+            'source': image,
+            **{variant: {'src': image, 'webp': image}
+               for variant in RECIPE_IMAGE_VARIANTS}
+        }
+    )
+
+
+def image_data(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (4, 4), color).save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+# The caches would hide the queries of everything they hold.
+@override_settings(RESPONSE_CACHE_TIMEOUT=0, RECIPE_FRAGMENT_TIMEOUT=0)
+class RecipeListQueriesTest(TestCase):
+    """The recipe list issues the same queries for any page size."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(0)
+        cls.token = Token.objects.create(user=cls.user)
+        tags = [
+            Tag.objects.create(name=f'Тег {index}', color=f'#00000{index}',
+                               slug=f'tag-{index}')
+            for index in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {index}',
+                                      measurement_unit='г')
+            for index in range(5)
+        ]
+        for index in range(RECIPE_COUNT):
+            author = create_user(index + 1)
+            recipe = Recipe.objects.create(
+                author=author, name=f'Рецепт {index}', text='Текст',
+                cooking_time=10, image='recipes/images/recipe.png'
+            )
+            recipe.tags.set(tags[:index % 3 + 1])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=10)
+                for ingredient in ingredients[:index % 5 + 1]
+            )
+            if index % 2:
+                Favorite.objects.create(user=cls.user, recipe=recipe)
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def assert_list_queries(self, count):
+        for limit in (2, RECIPE_COUNT):
+            with self.subTest(limit=limit), self.assertNumQueries(count):
+                response = self.client.get(f'/api/recipes/?limit={limit}')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), limit)
+
+    def test_anonymous(self):
+        # The ETag aggregate, COUNT(*), the page, tags, ingredient rows
+        # and ingredients.
+        self.assert_list_queries(6)
+
+    def test_authenticated(self):
+        # The token and the followed authors on top.
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assert_list_queries(8)
+
+
+class RecipeWriteQueriesTest(TestCase):
+    """Creating and updating a recipe costs the same queries for one
+    ingredient as for INGREDIENT_COUNT of them."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(0)
+        cls.token = Token.objects.create(user=cls.user)
+        cls.tags = [
+            Tag.objects.create(name=f'Тег {index}', color=f'#00000{index}',
+                               slug=f'tag-{index}')
+            for index in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {index}',
+                                      measurement_unit='г')
+            for index in range(3 * INGREDIENT_COUNT)
+        ]
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def ingredient_payload(self, ingredients, amount):
+        return [{'id': ingredient.id, 'amount': amount}
+                for ingredient in ingredients]
+
+    def test_create(self):
+        for count in (1, INGREDIENT_COUNT):
+            payload = {
+                'name': 'Рецепт', 'text': 'Текст', 'cooking_time': 10,
+                # New bytes each time, so every image is stored anew.
+                'image': image_data((count, 0, 0)),
+                'tags': [tag.id for tag in self.tags],
+                'ingredients': self.ingredient_payload(
+                    self.ingredients[:count], 10),
+            }
+            with self.subTest(ingredients=count), self.assertNumQueries(23):
+                response = self.client.post('/api/recipes/', payload,
+                                            format='json')
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(len(response.data['ingredients']), count)
+
+    def test_update(self):
+        for count in (1, INGREDIENT_COUNT):
+            recipe = Recipe.objects.create(
+                author=self.user, name='Рецепт', text='Текст',
+                cooking_time=10, image='recipes/images/recipe.png'
+            )
+            recipe.tags.set(self.tags[:1])
+            # Half of the ingredients change their amount, the other half
+            # is replaced.
+            kept = self.ingredients[:count]
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=10)
+                for ingredient in kept + self.ingredients[-count:]
+            )
+            ShoppingCart.objects.create(user=self.user, recipe=recipe)
+            payload = {
+                'tags': [tag.id for tag in self.tags[1:]],
+                'ingredients': (
+                    self.ingredient_payload(kept, 20)
+                    + self.ingredient_payload(
+                        self.ingredients[count:2 * count], 10)
+                ),
+            }
+            with self.subTest(ingredients=count), self.assertNumQueries(33):
+                response = self.client.patch(f'/api/recipes/{recipe.id}/',
+                                             payload, format='json')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['ingredients']),
+                                 2 * count)
+
+
+class ShoppingListSignalsTest(TestCase):
+    """Writes of recipe ingredients outside the API keep the stored
+    shopping lists equal to the live totals."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {index}',
+                                      measurement_unit='г')
+            for index in range(4)
+        ]
+        cls.recipe = Recipe.objects.create(
+            author=create_user(0), name='Рецепт', text='Текст',
+            cooking_time=10, image='recipes/images/recipe.png'
+        )
+        for index in range(1, 3):
+            ShoppingCart.objects.create(user=create_user(index),
+                                        recipe=cls.recipe)
+
+    def assert_lists_match(self):
+        stored = {
+            (item.user_id, item.ingredient_id): item.total
+            for item in ShoppingListItem.objects.all()
+        }
+        live = {
+            (item['user_id'], item['ingredient_id']): item['live_total']
+            for item in ShoppingListItem.objects.live_totals()
+        }
+        self.assertEqual(stored, live)
+
+    def add(self, ingredient, amount):
+        return RecipeIngredient.objects.create(
+            recipe=self.recipe, ingredient=ingredient, amount=amount)
+
+    def test_create_and_save(self):
+        row = self.add(self.ingredients[0], 10)
+        self.assert_lists_match()
+        row.amount = 30
+        row.save()
+        self.assert_lists_match()
+        row.ingredient = self.ingredients[1]
+        row.save()
+        self.assert_lists_match()
+
+    def test_save_of_row_built_with_pk(self):
+        row = self.add(self.ingredients[0], 10)
+        RecipeIngredient(pk=row.pk, recipe=self.recipe,
+                         ingredient=self.ingredients[0], amount=5).save()
+        self.assert_lists_match()
+
+    def test_delete(self):
+        row = self.add(self.ingredients[0], 10)
+        self.add(self.ingredients[1], 20)
+        row.delete()
+        self.assert_lists_match()
+
+    def test_queryset_delete(self):
+        for ingredient in self.ingredients:
+            self.add(ingredient, 10)
+        RecipeIngredient.objects.filter(
+            ingredient__in=self.ingredients[:3]).delete()
+        self.assert_lists_match()
+
+    def test_recipe_and_ingredient_delete(self):
+        for ingredient in self.ingredients:
+            self.add(ingredient, 10)
+        self.ingredients[0].delete()
+        self.assert_lists_match()
+        self.recipe.delete()
+        self.assert_lists_match()
+        self.assertFalse(ShoppingListItem.objects.exists())
+
+
+class RecipeCountersTest(TestCase):
+    """Content saves of the API and the admin keep concurrent counter
+    increments."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(0)
+        cls.recipe = Recipe.objects.create(
+            author=cls.user, name='Рецепт', text='Текст',
+            cooking_time=10, image='recipes/images/recipe.png'
+        )
+
+    def test_save_content_keeps_counters(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        recipe.name = 'Новое название'
+        recipe.save_content()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, 'Новое название')
+        self.assertEqual(recipe.favorites_count, 1)
+
+    def test_save_content_of_deleted_recipe(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        Recipe.objects.filter(pk=recipe.pk).delete()
+        with self.assertRaises(DatabaseError):
+            recipe.save_content()
+
+    def test_save_of_deleted_recipe(self):
+        # A plain save keeps Django's behavior and inserts the row again.
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        Recipe.objects.filter(pk=recipe.pk).delete()
+        recipe.save()
+        self.assertTrue(Recipe.objects.filter(pk=recipe.pk).exists())
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class RecipeTagFilterTest(TestCase):
+    """``tags`` matches any of the slugs, or all with ``tags_match=all``."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user(0)
+        cls.tags = {
+            slug: Tag.objects.create(name=slug, color=f'#00000{index}',
+                                     slug=slug)
+            for index, slug in enumerate(('a', 'b', 'c'))
+        }
+        for name, slugs in (('ab', 'ab'), ('a', 'a'), ('bc', 'bc'),
+                            ('none', '')):
+            recipe = Recipe.objects.create(
+                author=author, name=name, text='Текст', cooking_time=10,
+                image='recipes/images/recipe.png'
+            )
+            recipe.tags.set(cls.tags[slug] for slug in slugs)
+
+    def setUp(self):
+        # New version tokens make the tag catalog see the tags created
+        # in setUpTestData, whose on_commit bumps never ran.
+        cache.clear()
+
+    def names(self, query):
+        response = self.client.get(f'/api/recipes/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return {recipe['name'] for recipe in response.data['results']}
+
+    def filtered_names(self, query, deleted):
+        """Names for a query whose tags are deleted after validation."""
+        filterset = RecipeFilter(QueryDict(query),
+                                 queryset=Recipe.objects.all())
+        self.assertTrue(filterset.is_valid())
+        slugs = {slug: tag.id for slug, tag in self.tags.items()
+                 if slug not in deleted}
+        with patch.object(tag_slugs, 'get', return_value=slugs):
+            return set(filterset.qs.values_list('name', flat=True))
+
+    def test_any(self):
+        self.assertEqual(self.names('tags=a&tags=c'), {'ab', 'a', 'bc'})
+        self.assertEqual(self.names('tags=b&tags_match=any'), {'ab', 'bc'})
+
+    def test_all(self):
+        self.assertEqual(self.names('tags=a&tags=b&tags_match=all'),
+                         {'ab'})
+        self.assertEqual(self.names('tags=a&tags=c&tags_match=all'),
+                         set())
+
+    def test_unknown_slug(self):
+        response = self.client.get('/api/recipes/?tags=a&tags=unknown')
+        self.assertEqual(response.status_code, 400)
+
+    def test_deleted_tag(self):
+        self.assertEqual(self.filtered_names('tags=a&tags=b', {'b'}),
+                         {'ab', 'a'})
+        self.assertEqual(
+            self.filtered_names('tags=a&tags=b&tags_match=all', {'b'}),
+            set())
+
+
+class RecipeInvalidationTest(TestCase):
+    """Conditional and cached anonymous reads follow every change."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # As if committed: pending bumps would hold back those of the tests.
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.create_recipe()
+
+    @classmethod
+    def create_recipe(cls):
+        cls.author = create_user(0)
+        cls.token = Token.objects.create(user=cls.author)
+        cls.ingredient = Ingredient.objects.create(name='Ингредиент',
+                                                   measurement_unit='г')
+        cls.recipe = create_recipe(cls.author)
+        cls.row = RecipeIngredient.objects.create(
+            recipe=cls.recipe, ingredient=cls.ingredient, amount=10)
+
+    def setUp(self):
+        cache.clear()
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+        self.author_client = APIClient()
+        self.author_client.credentials(
+            HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def get(self, url, etag=None, client=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return (client or self.client).get(url, **headers)
+
+    def change_amount(self, amount):
+        with self.captureOnCommitCallbacks(execute=True):
+            row = RecipeIngredient.objects.get(pk=self.row.pk)
+            row.amount = amount
+            row.save()
+
+    def amount(self, response):
+        return response.data['ingredients'][0]['amount']
+
+    def test_not_modified(self):
+        response = self.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        # Answered from the response cache, which keeps the validators.
+        self.assertEqual(self.get(self.url, response['ETag']).status_code,
+                         304)
+
+    def test_every_change_is_seen(self):
+        etag = self.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.author_client.patch(
+                self.url, {'name': 'Новое название'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        response = self.get(self.url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['name'], 'Новое название')
+        # A second change of the same recipe in the same test transaction.
+        self.change_amount(20)
+        response = self.get(self.url, response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.amount(response), 20)
+
+    def test_deleted_recipe(self):
+        self.change_amount(20)
+        self.assertEqual(self.get(self.url).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author_client.delete(self.url)
+        self.assertEqual(self.get(self.url).status_code, 404)
+
+    def test_rolled_back_change(self):
+        self.assertEqual(self.amount(self.get(self.url)), 10)
+        with self.assertRaises(DatabaseError):
+            with transaction.atomic():
+                self.row.amount = 30
+                self.row.save()
+                raise DatabaseError
+        self.change_amount(20)
+        self.assertEqual(self.amount(self.get(self.url)), 20)
+
+    def test_list(self):
+        self.assertEqual(self.get('/api/recipes/')['X-Cache'], 'MISS')
+        response = self.get('/api/recipes/')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(self.get('/api/recipes/', response['ETag'])
+                         .status_code, 304)
+        self.change_amount(20)
+        response = self.get('/api/recipes/', response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(
+            response.data['results'][0]['ingredients'][0]['amount'], 20)
+
+    def test_per_user_flags(self):
+        response = self.get(self.url, client=self.author_client)
+        self.assertFalse(response.data['is_favorited'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author_client.post(f'{self.url}favorite/')
+        response = self.get(self.url, response['ETag'],
+                            client=self.author_client)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['is_favorited'])
+
+
+class AsyncReadViewsTest(TestCase):
+    """The async views answer like the viewsets they stand in for."""
+
+    @classmethod
+    def setUpTestData(cls):
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.author = create_user(0)
+            cls.token = Token.objects.create(user=cls.author)
+            cls.recipe = create_recipe(cls.author)
+            RecipeIngredient.objects.create(
+                recipe=cls.recipe, amount=10,
+                ingredient=Ingredient.objects.create(
+                    name='Ингредиент', measurement_unit='г'))
+            ShoppingCart.objects.create(user=cls.author, recipe=cls.recipe)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, view, path, token=None, **kwargs):
+        """The async response to ``path`` after checking it against the
+        viewset's."""
+        headers = {'Authorization': f'Token {token}'} if token else {}
+        expected = self.client.get(path, headers=headers)
+        response = async_to_sync(view)(
+            AsyncRequestFactory().get(path, headers=headers), **kwargs)
+        self.assertEqual(response.status_code, expected.status_code)
+        # The viewset streams the shopping list.
+        self.assertEqual(response.getvalue(), expected.getvalue())
+        for header in ('Allow', 'Content-Type', 'ETag', 'WWW-Authenticate'):
+            self.assertEqual(response.get(header), expected.get(header),
+                             header)
+        return response
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=0)
+    def test_recipes(self):
+        for token in (None, self.token.key):
+            self.get(async_views.recipe_list, '/api/recipes/', token)
+            self.get(async_views.recipe_detail,
+                     f'/api/recipes/{self.recipe.pk}/', token,
+                     pk=self.recipe.pk)
+        self.assertEqual(self.get(async_views.recipe_detail,
+                                  '/api/recipes/0/', pk=0).status_code, 404)
+
+    def test_response_cache(self):
+        view = async_views.recipe_list
+        request = AsyncRequestFactory().get('/api/recipes/')
+        self.assertEqual(async_to_sync(view)(request)['X-Cache'], 'MISS')
+        self.assertEqual(async_to_sync(view)(request)['X-Cache'], 'HIT')
+        # The viewset shares the entry.
+        self.assertEqual(self.client.get('/api/recipes/')['X-Cache'], 'HIT')
+
+    def test_ingredients(self):
+        self.get(async_views.ingredient_list, '/api/ingredients/?name=ин')
+
+    def test_download_shopping_cart(self):
+        path = '/api/recipes/download_shopping_cart/'
+        self.assertEqual(
+            self.get(async_views.download_shopping_cart, path).status_code,
+            401)
+        self.assertEqual(self.get(async_views.download_shopping_cart, path,
+                                  self.token.key).status_code, 200)
+
+    def test_invalid_token(self):
+        response = self.get(async_views.recipe_list, '/api/recipes/',
+                            'invalid')
+        self.assertEqual(response.status_code, 401)
+
+
+class ReplicaRouterTest(SimpleTestCase):
+    """Reads of a routed request go to the replica until it writes."""
+
+    router = ReplicaRouter()
+
+    def route(self, replica=True):
+        token = routing.set(RoutingState(replica))
+        self.addCleanup(routing.reset, token)
+
+    def test_outside_requests(self):
+        self.assertEqual(self.router.db_for_read(Recipe), DEFAULT_DB_ALIAS)
+
+    def test_reads(self):
+        self.route()
+        self.assertEqual(self.router.db_for_read(Recipe), REPLICA)
+        self.assertEqual(self.router.db_for_read(Token), DEFAULT_DB_ALIAS)
+
+    def test_unsafe_request(self):
+        self.route(replica=False)
+        self.assertEqual(self.router.db_for_read(Recipe), DEFAULT_DB_ALIAS)
+
+    def test_reads_after_write(self):
+        self.route()
+        self.assertEqual(self.router.db_for_write(Recipe), DEFAULT_DB_ALIAS)
+        self.assertEqual(self.router.db_for_read(Recipe), DEFAULT_DB_ALIAS)
+
+    def test_primary_reads(self):
+        self.route()
+        with primary_reads():
+            self.assertEqual(self.router.db_for_read(Recipe),
+                             DEFAULT_DB_ALIAS)
+        self.assertEqual(self.router.db_for_read(Recipe), REPLICA)
+
+    def test_middleware_stays_async(self):
+        async def get_response(request):
+            return routing.get()
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        state = async_to_sync(middleware)(
+            RequestFactory().get('/api/recipes/'))
+        self.assertEqual(state.read_alias, REPLICA)
+
+
+# The alias is a test mirror of the primary (see settings), so the data
+# has to be committed for the replica connection to see it.
+@override_settings(
+    DATABASE_ROUTERS=['api.replica.ReplicaRouter'],
+    MIDDLEWARE=['api.middleware.ReplicaRoutingMiddleware',
+                *settings.MIDDLEWARE],
+    RESPONSE_CACHE_TIMEOUT=0, RECIPE_FRAGMENT_TIMEOUT=0
+)
+class ReplicaRoutingTest(TransactionTestCase):
+    """A client reads its own writes from the primary for a while."""
+
+    databases = {DEFAULT_DB_ALIAS, REPLICA}
+
+    def setUp(self):
+        cache.clear()
+        self.writer, self.reader = create_user(0), create_user(1)
+        self.recipe = create_recipe(self.writer)
+        self.auth = {
+            user: {'HTTP_AUTHORIZATION':
+                   f'Token {Token.objects.create(user=user).key}'}
+            for user in (self.writer, self.reader)
+        }
+
+    def replica_queries(self, request):
+        with CaptureQueriesContext(connections[REPLICA]) as queries:
+            response = request()
+        self.assertLess(response.status_code, 400)
+        return len(queries)
+
+    def get_list(self, user):
+        return self.client.get('/api/recipes/', **self.auth[user])
+
+    def test_read_your_writes(self):
+        self.assertGreater(
+            self.replica_queries(lambda: self.get_list(self.writer)), 0)
+        self.assertEqual(self.replica_queries(lambda: self.client.post(
+            f'/api/recipes/{self.recipe.pk}/favorite/',
+            **self.auth[self.writer])), 0)
+        self.assertEqual(
+            self.replica_queries(lambda: self.get_list(self.writer)), 0)
+        self.assertGreater(
+            self.replica_queries(lambda: self.get_list(self.reader)), 0)
+
+    @override_settings(REPLICA_STICKY_SECONDS=0)
+    def test_pin_expires(self):
+        self.client.post(f'/api/recipes/{self.recipe.pk}/favorite/',
+                         **self.auth[self.writer])
+        self.assertGreater(
+            self.replica_queries(lambda: self.get_list(self.writer)), 0)
+
+    async def test_async_requests(self):
+        response = await self.async_client.post(
+            f'/api/recipes/{self.recipe.pk}/favorite/',
+            headers={'Authorization':
+                     self.auth[self.writer]['HTTP_AUTHORIZATION']}
+        )
+        self.assertEqual(response.status_code, 201)
+        for user, pinned in ((self.writer, True), (self.reader, False)):
+            key = client_key(RequestFactory().get('/', **self.auth[user]))
+            self.assertIs(await ais_pinned(key), pinned)
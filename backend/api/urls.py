@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
+from api import async_views
 from api.views import (
     IngredientViewSet, TagViewSet,
     RecipeViewSet, UserViewSet
@@ -17,3 +19,12 @@ urlpatterns = [
     path('auth/', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
+
+if settings.ASYNC_READ_VIEWS:
+    urlpatterns = [
+        path('ingredients/', async_views.ingredient_list),
+        path('recipes/', async_views.recipe_list),
+        path('recipes/download_shopping_cart/',
+             async_views.download_shopping_cart),
+        path('recipes/<int:pk>/', async_views.recipe_detail),
+    ] + urlpatterns
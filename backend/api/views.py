@@ -2,18 +2,19 @@ import base64
 import imghdr
 
 from django.core.files.base import ContentFile
-from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
-from django.db.models import Sum, F
+from django.db.models import Count, F, Max, Prefetch, Window
+from django.db.models.functions import RowNumber
 from rest_framework import viewsets, status, serializers
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 
 from users.models import User, Follow
 from recipes.models import (
-    Recipe, Tag, Ingredient, Favorite, ShoppingCart, RecipeIngredient
+    Recipe, Tag, Ingredient, Favorite, ShoppingCart, ShoppingListItem
 )
 from api.serializers import (
     UserSerializer, FollowCreateSerializer,
@@ -22,8 +23,22 @@ from api.serializers import (
     ShoppingCartSerializer, TagSerializer,
     IngredientSerializer, FavoriteSerializer
 )
-from api.filters import RecipeFilter, IngredientFilter
+from api.cache import (
+    RECIPE, RECIPES, USER, USERS, aget_version, cache_anonymous_response,
+    get_version
+)
+from api.catalog import (
+    INGREDIENTS, TAGS, ingredient_catalog, ingredient_index, tag_catalog
+)
+from api.conditional import conditional, make_etag
+from api.exports import pdf_export_available, shopping_list_response
+from api.filters import RecipeFilter, RecipeOrderingFilter
+from api.pagination import RecipePagination
 from api.permissions import IsAuthorOrReadOnly
+from api.renderers import (
+    TextShoppingListRenderer, CSVShoppingListRenderer,
+    PDFShoppingListRenderer
+)
 
 
 # ─────────────────────────────────────────────────────────────
@@ -85,7 +100,21 @@ class UserViewSet(UserViewSet):
 
     @action(detail=False, methods=['get'], permission_classes=[AllowAny])
     def subscriptions(self, request):
-        authors = User.objects.filter(following__user=request.user).distinct()
+        recipes = Recipe.objects.all()
+        limit = request.query_params.get('recipes_limit')
+        if limit and limit.isdigit():
+            recipes = recipes.annotate(row_number=Window(
+                RowNumber(),
+                partition_by=F('author_id'),
+                order_by=(F('pub_date').desc(), F('id').desc())
+            )).filter(row_number__lte=int(limit))
+        authors = (
+            User.objects.filter(following__user=request.user)
+            .annotate(recipes_count=Count('recipes'))
+            .prefetch_related(Prefetch('recipes', queryset=recipes,
+                                       to_attr='limited_recipes'))
+            .order_by('id')
+        )
         page = self.paginate_queryset(authors)
         serializer = SubscriptionSerializer(page, many=True,
                                             context={'request': request})
@@ -101,6 +130,11 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = TagSerializer
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format == 'json':
+            return tag_catalog.response(request)
+        return super().list(request, *args, **kwargs)
+
 
 # ─────────────────────────────────────────────────────────────
 #                      INGREDIENTS
@@ -110,25 +144,114 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
-    filterset_class = IngredientFilter
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name:
+            return Response(ingredient_index.search(name))
+        if request.accepted_renderer.format == 'json':
+            return ingredient_catalog.response(request)
+        return super().list(request, *args, **kwargs)
 
 
 # ─────────────────────────────────────────────────────────────
 #                         RECIPES
 # ─────────────────────────────────────────────────────────────
 
+# Aggregates of the filtered recipes that the list ETag covers.
+LIST_STATE = {'last_modified': Max('updated_at'), 'count': Count('id')}
+
+SHOPPING_LIST_RENDERERS = [TextShoppingListRenderer, CSVShoppingListRenderer]
+if pdf_export_available():
+    SHOPPING_LIST_RENDERERS.append(PDFShoppingListRenderer)
+
+
 class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = Recipe.objects.select_related('author').prefetch_related(
-        'tags', 'recipe_ingredients__ingredient'
-    )
+    queryset = Recipe.objects.select_related('author')
     permission_classes = (IsAuthorOrReadOnly,)
+    pagination_class = RecipePagination
+    filter_backends = (DjangoFilterBackend, RecipeOrderingFilter)
     filterset_class = RecipeFilter
+    ordering_fields = ('pub_date', 'favorites_count', 'in_cart_count')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            # RecipeReadSerializer prefetches the recipes it has to build.
+            return queryset.with_user_flags(self.request.user)
+        return queryset.prefetch_related(
+            'tags', 'recipe_ingredients__ingredient')
 
     def get_serializer_class(self):
         if self.action in ('create', 'update', 'partial_update'):
             return RecipeWriteSerializer
         return RecipeReadSerializer
 
+    def viewer_state(self, request):
+        """What the per-user flags of the representation depend on."""
+        user = request.user
+        if not user.is_authenticated:
+            return None
+        return user.pk, get_version(USER.format(pk=user.pk))
+
+    async def aviewer_state(self, request):
+        """viewer_state() for async views."""
+        user = request.user
+        if not user.is_authenticated:
+            return None
+        return user.pk, await aget_version(USER.format(pk=user.pk))
+
+    def list_validators(self, request):
+        if self.orders_by_counter(request):
+            return None
+        state = (
+            self.filter_queryset(Recipe.objects.all()).order_by()
+            .aggregate(**LIST_STATE)
+        )
+        return self.list_etag(request, state,
+                              self.viewer_state(request)), None
+
+    def orders_by_counter(self, request):
+        # Counters change without touching updated_at or bumping RECIPES.
+        ordering = request.query_params.get('ordering', '')
+        return any(field.lstrip('-') in ('favorites_count', 'in_cart_count')
+                   for field in ordering.split(','))
+
+    def list_etag(self, request, state, viewer):
+        # No Last-Modified: the newest change cannot reflect a deletion,
+        # while the count in the ETag does.
+        return make_etag(state['last_modified'], state['count'],
+                         request.accepted_renderer.format, viewer)
+
+    def retrieve_validators(self, request, pk=None):
+        if not str(pk).isdigit():
+            return None
+        return self.detail_validators(
+            request,
+            Recipe.objects.filter(pk=pk).values_list(
+                'updated_at', flat=True).first(),
+            self.viewer_state(request)
+        )
+
+    def detail_validators(self, request, updated_at, viewer):
+        if updated_at is None:
+            return None
+        etag = make_etag(updated_at, request.accepted_renderer.format,
+                         viewer)
+        # Changes of the per-user flags have no timestamp.
+        return etag, updated_at if viewer is None else None
+
+    @cache_anonymous_response(RECIPES, TAGS, INGREDIENTS, USERS,
+                              bypass='orders_by_counter')
+    @conditional('list_validators')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_anonymous_response(RECIPE, TAGS, INGREDIENTS, USERS)
+    @conditional('retrieve_validators')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     # ──────── FAVORITES ────────
 
     @action(detail=True, methods=['post'],
@@ -182,21 +305,11 @@ class RecipeViewSet(viewsets.ModelViewSet):
     # ──────── DOWNLOAD CART ────────
 
     @action(detail=False, methods=['get'],
-            permission_classes=[IsAuthenticated])
+            permission_classes=[IsAuthenticated],
+            renderer_classes=SHOPPING_LIST_RENDERERS)
     def download_shopping_cart(self, request):
-        items = (
-            RecipeIngredient.objects
-            .filter(recipe__in_shopping_cart__user=request.user)
-            .values(name=F('ingredient__name'),
-                    unit=F('ingredient__measurement_unit'))
-            .annotate(total=Sum('amount'))
-            .order_by('name')
-        )
-        lines = [f"{i['name']} ({i['unit']}) — {i['total']}" for i in items]
-        content = '\n'.join(lines) if lines else 'Список пуст.'
-
-        response = HttpResponse(content,
-                                content_type='text/plain; charset=utf-8')
-        response['Content-Disposition'] = (
-            'attachment; filename="shopping_list.txt"')
-        return response
+        return shopping_list_response(self.shopping_list_items(request),
+                                      request.accepted_renderer.format)
+
+    def shopping_list_items(self, request):
+        return ShoppingListItem.objects.for_export(request.user)
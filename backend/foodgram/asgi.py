@@ -8,9 +8,18 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
 
 import os
+import threading
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
 application = get_asgi_application()
+
+from api.catalog import warm_up  # noqa: E402
+
+# ASGI servers may import the application inside their event loop, where
+# the ORM refuses to run.
+warm_up_thread = threading.Thread(target=warm_up)
+warm_up_thread.start()
+warm_up_thread.join()
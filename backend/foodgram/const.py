@@ -11,3 +11,10 @@ MAX_LENGTH_USERNAME = 150
 MAX_LENGTH_NAME = 150
 MIN_INGREDIENT_AMOUNT = 1
 MAX_INGREDIENT_AMOUNT = 32000
+EXPORT_CHUNK_SIZE = 8192
+EXPORT_ITERATOR_CHUNK_SIZE = 2000
+RECIPE_IMAGE_VARIANTS = {
+    'thumbnail': (240, 180),
+    'card': (720, 540),
+}
+IMAGE_VARIANT_QUALITY = 82
@@ -1,4 +1,5 @@
 import os
+import sys
 from pathlib import Path
 from django.core.management.utils import get_random_secret_key
 
@@ -47,6 +48,12 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+SQL_INSTRUMENTATION = os.getenv('SQL_INSTRUMENTATION', 'False') == 'True'
+N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', '3'))
+
+if SQL_INSTRUMENTATION:
+    MIDDLEWARE.insert(0, 'api.middleware.QueryInstrumentationMiddleware')
+
 ROOT_URLCONF = 'foodgram.urls'
 
 
@@ -89,6 +96,67 @@ DATABASES = {
     'default': PG_DATABASE_SETTINGS if ENABLE_PG_DATABASE else SQLITE_DATABASE_SETTINGS,
 }
 
+# Optional read replica for safe API requests (see api.replica):
+# DB_REPLICA_HOST for PostgreSQL (DB_REPLICA_NAME and DB_REPLICA_PORT
+# default to the primary's), DB_REPLICA_NAME for a second SQLite file.
+if ENABLE_PG_DATABASE and os.getenv('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **PG_DATABASE_SETTINGS,
+        'HOST': os.getenv('DB_REPLICA_HOST'),
+        'NAME': os.getenv('DB_REPLICA_NAME', PG_DATABASE_SETTINGS['NAME']),
+        'PORT': int(os.getenv('DB_REPLICA_PORT',
+                              PG_DATABASE_SETTINGS['PORT'])),
+    }
+elif not ENABLE_PG_DATABASE and os.getenv('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **SQLITE_DATABASE_SETTINGS,
+        'NAME': os.getenv('DB_REPLICA_NAME'),
+    }
+
+if 'replica' in DATABASES:
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+    DATABASE_ROUTERS = ['api.replica.ReplicaRouter']
+    MIDDLEWARE.insert(0, 'api.middleware.ReplicaRoutingMiddleware')
+elif sys.argv[1:2] == ['test']:
+    # Lets the tests of api.replica route to a mirror of the primary; the
+    # router and middleware are only turned on by those tests.
+    DATABASES['replica'] = {
+        **DATABASES['default'], 'TEST': {'MIRROR': 'default'},
+    }
+
+# How long a client reads from the primary after its own write; should
+# exceed the replication lag.
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '5'))
+
+
+# Local memory by default, which only suits a single process. Cache
+# versions and catalogs (api.cache, api.catalog) never expire, so a
+# deployment with several workers, or one changing data through the admin
+# or manage.py, needs a shared backend such as Redis for invalidations to
+# reach every process; docker-compose configures one.
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    },
+}
+
+if CACHE_BACKEND.endswith('LocMemCache'):
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '5000')),
+    }
+
+# Whether the backend is shared by every process and increments atomically;
+# response cache metrics are only counted then.
+SHARED_CACHE = CACHE_BACKEND.endswith(
+    ('RedisCache', 'PyMemcacheCache', 'PyLibMCCache'))
+
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', '300'))
+RECIPE_FRAGMENT_TIMEOUT = int(os.getenv('RECIPE_FRAGMENT_TIMEOUT', '86400'))
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -113,7 +181,21 @@ MEDIA_ROOT = BASE_DIR / 'media'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# orjson-backed JSON rendering with the same output (see
+# api.renderers.FastJSONRenderer); it falls back to the stdlib encoder
+# when orjson is not installed.
+FAST_JSON_RENDERER = os.getenv('FAST_JSON_RENDERER', 'True') == 'True'
+
+# Async views for the hot read endpoints (see api.async_views). They only
+# pay off under an ASGI server; compare with benchmark_asgi first.
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', 'False') == 'True'
+
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.FastJSONRenderer' if FAST_JSON_RENDERER
+        else 'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework.authentication.TokenAuthentication',
     ),
@@ -124,6 +206,15 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 6,
 }
 
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', '100'))
+
+IMAGE_VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', '2'))
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
 AUTH_USER_MODEL = 'users.User'
 
 DJOSER = {
@@ -4,8 +4,7 @@ from .models import (
     Recipe,
     Ingredient,
     Tag,
-    RecipeIngredient,
-    Favorite
+    RecipeIngredient
 )
 
 
@@ -17,15 +16,19 @@ class RecipeIngredientInline(admin.TabularInline):
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author', 'cooking_time', 'favorites_count')
+    list_display = ('name', 'author', 'cooking_time',
+                    'favorites_count', 'in_cart_count')
     search_fields = ('name', 'author__username', 'author__email')
     list_filter = ('tags',)
+    list_select_related = ('author',)
 
     inlines = [RecipeIngredientInline]
 
-    def favorites_count(self, obj):
-        return Favorite.objects.filter(recipe=obj).count()
-    favorites_count.short_description = 'Добавлений в избранное'
+    def save_model(self, request, obj, form, change):
+        if change:
+            obj.save_content()
+        else:
+            super().save_model(request, obj, form, change)
 
 
 @admin.register(Ingredient)
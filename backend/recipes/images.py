@@ -0,0 +1,118 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.dispatch import Signal
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from foodgram.const import IMAGE_VARIANT_QUALITY, RECIPE_IMAGE_VARIANTS
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = 'recipes/images/variants'
+
+# Sent with ``recipe_id`` once the variants are stored on the recipe;
+# the update() that stores them does not send post_save.
+variants_ready = Signal()
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_VARIANT_WORKERS,
+            thread_name_prefix='image-variants'
+        )
+    return _executor
+
+
+def _encode(image, image_format):
+    buffer = io.BytesIO()
+    options = {'quality': IMAGE_VARIANT_QUALITY}
+    if image_format == 'JPEG':
+        image = image.convert('RGB')
+        options['optimize'] = True
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def render_variants(image_file):
+    """Yield (variant, extension, bytes) for every size and encoding.
+
+    Images with transparency keep it in PNG, everything else becomes
+    JPEG; each size is additionally encoded as WebP.
+    """
+    with Image.open(image_file) as source:
+        source = ImageOps.exif_transpose(source)
+        has_alpha = 'A' in source.getbands() or 'transparency' in source.info
+        fallback = ('PNG', 'png') if has_alpha else ('JPEG', 'jpg')
+        if has_alpha:
+            source = source.convert('RGBA')
+        for variant, size in RECIPE_IMAGE_VARIANTS.items():
+            resized = ImageOps.fit(source, size, Image.Resampling.LANCZOS)
+            for image_format, extension in (fallback, ('WEBP', 'webp')):
+                yield variant, extension, _encode(resized, image_format)
+
+
+def generate_variants(recipe_id):
+    """Write the variants of a recipe's current image and record them."""
+    from recipes.models import Recipe
+
+    recipe = Recipe.objects.filter(pk=recipe_id).only(
+        'image', 'image_variants').first()
+    if recipe is None or not recipe.image:
+        return
+    source = recipe.image.name
+    storage = recipe.image.storage
+    stem = os.path.splitext(os.path.basename(source))[0]
+    variants = {'source': source}
+    with recipe.image.open('rb') as image_file:
+        for variant, extension, content in render_variants(image_file):
+            name = storage.save(f'{VARIANTS_DIR}/{stem}_{variant}.{extension}',
+                                ContentFile(content))
+            key = 'webp' if extension == 'webp' else 'src'
+            variants.setdefault(variant, {})[key] = name
+    updated = Recipe.objects.filter(pk=recipe_id, image=source).update(
+        image_variants=variants, updated_at=timezone.now())
+    if updated:
+        variants_ready.send(sender=Recipe, recipe_id=recipe_id)
+    # Variants of a superseded image, or of one replaced while rendering.
+    release_variants(storage, recipe.image_variants if updated else variants)
+
+
+def release_variants(storage, variants):
+    for names in variants.values():
+        if isinstance(names, dict):
+            for name in names.values():
+                storage.delete(name)
+
+
+def _run(recipe_id):
+    try:
+        generate_variants(recipe_id)
+    except Exception:
+        logger.exception('Image variants failed for recipe %s', recipe_id)
+    finally:
+        connection.close()
+
+
+def schedule_variants(recipe_id):
+    """Render the variants in the worker pool once the save commits.
+
+    With IMAGE_VARIANT_WORKERS set to 0 they are rendered in the
+    committing thread instead.
+    """
+    def submit():
+        if settings.IMAGE_VARIANT_WORKERS:
+            _get_executor().submit(_run, recipe_id)
+        else:
+            generate_variants(recipe_id)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = ('Compares the stored shopping list aggregate with the one '
+            'computed from the carts and optionally rebuilds it')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Replace the stored aggregate with the computed one'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            stored = {
+                (item['user_id'], item['ingredient_id']): item['total']
+                for item in ShoppingListItem.objects.select_for_update()
+                .values('user_id', 'ingredient_id', 'total')
+            }
+            live = {
+                (item['user_id'], item['ingredient_id']): item['live_total']
+                for item in ShoppingListItem.objects.live_totals()
+            }
+
+            mismatches = sorted(
+                key for key in stored.keys() | live.keys()
+                if stored.get(key) != live.get(key)
+            )
+            for user_id, ingredient_id in mismatches:
+                self.stdout.write(
+                    f'user {user_id}, ingredient {ingredient_id}: '
+                    f'stored {stored.get((user_id, ingredient_id))}, '
+                    f'expected {live.get((user_id, ingredient_id))}'
+                )
+
+            if options['rebuild']:
+                ShoppingListItem.objects.rebuild()
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS(
+                f'Shopping lists are consistent ({len(live)} rows)'))
+        elif options['rebuild']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Rebuilt shopping lists, fixed {len(mismatches)} rows'))
+        else:
+            raise CommandError(
+                f'{len(mismatches)} shopping list rows are out of sync, '
+                'run with --rebuild to fix them'
+            )
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import generate_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Renders thumbnail and card variants of recipe images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Re-render variants that are already up to date'
+        )
+
+    def handle(self, *args, **options):
+        rendered = 0
+        recipes = Recipe.objects.exclude(image='').only(
+            'image', 'image_variants')
+        for recipe in recipes.iterator():
+            if options['all'] or not recipe.image_variants_ready:
+                try:
+                    generate_variants(recipe.pk)
+                except OSError as error:
+                    self.stdout.write(self.style.ERROR(
+                        f'Recipe {recipe.pk}: {error}'))
+                    continue
+                rendered += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered image variants for {rendered} recipes'))
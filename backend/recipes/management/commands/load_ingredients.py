@@ -0,0 +1,94 @@
+import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import Ingredient, bulk_changed
+
+# data/ of the repository, or the same directory mounted into the
+# backend container by docker-compose.
+DEFAULT_PATH = next(
+    (path for path in (
+        settings.BASE_DIR.parent / 'data' / 'ingredients.csv',
+        settings.BASE_DIR / 'data' / 'ingredients.csv',
+    ) if path.exists()),
+    settings.BASE_DIR / 'data' / 'ingredients.csv'
+)
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8', newline='') as file:
+        for row in csv.reader(file):
+            if row:
+                yield row[0], row[1]
+
+
+def read_json(path):
+    with open(path, encoding='utf-8') as file:
+        for item in json.load(file):
+            yield item['name'], item['measurement_unit']
+
+
+READERS = {'.csv': read_csv, '.json': read_json}
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = 'Loads the ingredient catalog from a CSV or JSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            type=Path,
+            default=DEFAULT_PATH,
+            help=f'CSV (name,unit) or JSON file (default: {DEFAULT_PATH})'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows per INSERT (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        reader = READERS.get(path.suffix.lower())
+        if reader is None:
+            raise CommandError(f'Unsupported file type: {path.suffix}')
+        if not path.exists():
+            raise CommandError(f'File not found: {path}')
+
+        started = time.perf_counter()
+        total = 0
+        with transaction.atomic():
+            before = Ingredient.objects.count()
+            # Both columns form unique_ingredient_unit, so there is nothing
+            # to update on conflict and existing rows are skipped.
+            for batch in batches(reader(path), options['batch_size']):
+                Ingredient.objects.bulk_create(
+                    (Ingredient(name=name.strip(),
+                                measurement_unit=unit.strip())
+                     for name, unit in batch),
+                    ignore_conflicts=True
+                )
+                total += len(batch)
+            created = Ingredient.objects.count() - before
+            # bulk_create sends no post_save.
+            bulk_changed.send(sender=Ingredient)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Loaded {total} ingredients from {path.name}: {created} new, '
+            f'{total - created} already present, {elapsed:.3f} s'
+        ))
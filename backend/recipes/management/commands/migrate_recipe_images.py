@@ -0,0 +1,44 @@
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from recipes.images import generate_variants
+from recipes.models import Recipe
+from recipes.storage import ContentAddressedStorage
+
+
+class Command(BaseCommand):
+    help = ('Moves recipe images saved under flat names into the '
+            'content-addressed storage and re-renders their variants')
+
+    def handle(self, *args, **options):
+        storage = Recipe._meta.get_field('image').storage
+        legacy = FileSystemStorage(location=storage.location)
+        moved = {}
+        for recipe in Recipe.objects.exclude(image='').iterator():
+            old_name = recipe.image.name
+            if ContentAddressedStorage.is_content_addressed(old_name):
+                continue
+            if not legacy.exists(old_name):
+                self.stdout.write(self.style.ERROR(
+                    f'Recipe {recipe.pk}: {old_name} is missing'))
+                continue
+            with transaction.atomic():
+                with legacy.open(old_name) as image_file:
+                    name = storage.save(old_name, image_file)
+                Recipe.objects.filter(pk=recipe.pk).update(
+                    image=name, updated_at=timezone.now())
+            for names in recipe.image_variants.values():
+                if isinstance(names, dict):
+                    for variant_name in names.values():
+                        legacy.delete(variant_name)
+            generate_variants(recipe.pk)
+            moved[old_name] = name
+
+        for old_name in moved:
+            if not Recipe.objects.filter(image=old_name).exists():
+                legacy.delete(old_name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved {len(moved)} images into '
+            f'{len(set(moved.values()))} stored files'))
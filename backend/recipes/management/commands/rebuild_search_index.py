@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from recipes import search
+
+
+class Command(BaseCommand):
+    help = ('Recreates the recipe full-text index, e.g. after a migration '
+            'rebuilt the recipes table on SQLite and dropped its triggers')
+
+    def handle(self, *args, **options):
+        with connection.schema_editor() as editor:
+            search.uninstall(editor)
+            search.install(editor)
+        self.stdout.write(self.style.SUCCESS('Rebuilt the search index'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Recomputes Recipe.favorites_count and Recipe.in_cart_count '
+            'from the favorites and shopping carts')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            stale = Recipe.objects.with_live_counters().filter(
+                ~Q(favorites_count=F('live_favorites_count'))
+                | ~Q(in_cart_count=F('live_in_cart_count'))
+            ).count()
+            Recipe.objects.recount()
+        self.stdout.write(self.style.SUCCESS(
+            f'Recounted recipe counters, fixed {stale} recipes'))
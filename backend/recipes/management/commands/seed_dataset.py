@@ -0,0 +1,192 @@
+import io
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image
+
+from recipes.images import generate_variants
+from recipes.management.commands.load_ingredients import batches
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+    ShoppingListItem, Tag, bulk_changed
+)
+from users.models import Follow, User
+
+USERNAME_PREFIX = 'seed_user_'
+SEED_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+TAGS_DATA = [
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+    ('Десерт', '#D2A775', 'dessert'),
+    ('Выпечка', '#B64949', 'baking'),
+    ('Суп', '#4988B6', 'soup'),
+    ('Салат', '#7DB649', 'salad'),
+    ('Напиток', '#49B6A9', 'drink'),
+]
+FIRST_NAMES = ['Анна', 'Иван', 'Мария', 'Пётр', 'Ольга', 'Сергей',
+               'Елена', 'Дмитрий', 'Наталья', 'Алексей']
+LAST_NAMES = ['Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев',
+              'Соколов', 'Михайлов', 'Новиков', 'Фёдоров', 'Морозов']
+DISHES = ['Борщ', 'Плов', 'Сырники', 'Оливье', 'Блины', 'Пельмени',
+          'Шарлотка', 'Солянка', 'Котлеты', 'Винегрет']
+
+
+class Command(BaseCommand):
+    help = ('Fills an empty database with a large reproducible dataset '
+            'for benchmarks')
+
+    def add_arguments(self, parser):
+        for name, default, help_text in (
+            ('users', 10000, 'Number of users'),
+            ('recipes', 50000, 'Number of recipes'),
+            ('ingredients-per-recipe', 8, 'Ingredients per recipe'),
+            ('tags-per-recipe', 2, 'Tags per recipe'),
+            ('follows', 20, 'Follows per user'),
+            ('favorites', 30, 'Favorites per user'),
+            ('cart', 5, 'Shopping cart recipes per user'),
+            ('chunk-size', 5000, 'Rows per INSERT'),
+            ('seed', 42, 'Random seed'),
+        ):
+            parser.add_argument(
+                f'--{name}',
+                type=int,
+                default=default,
+                help=f'{help_text} (default: {default})'
+            )
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=USERNAME_PREFIX).exists():
+            raise CommandError('The database is already seeded, '
+                               'use a fresh one to get the same dataset.')
+        if not Ingredient.objects.exists():
+            call_command('load_ingredients', stdout=self.stdout)
+
+        self.rng = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        started = time.perf_counter()
+        with transaction.atomic():
+            user_ids = self.seed_users(options['users'])
+            tag_ids = self.seed_tags()
+            ingredient_ids = list(
+                Ingredient.objects.order_by('id').values_list('id', flat=True))
+            recipe_ids = self.seed_recipes(options['recipes'], user_ids)
+            self.insert(
+                'recipe tags', Recipe.tags.through,
+                (Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                 for recipe_id in recipe_ids
+                 for tag_id in self.sample(tag_ids,
+                                           options['tags_per_recipe']))
+            )
+            self.insert(
+                'recipe ingredients', RecipeIngredient,
+                (RecipeIngredient(recipe_id=recipe_id, ingredient_id=pk,
+                                  amount=self.rng.randint(1, 500))
+                 for recipe_id in recipe_ids
+                 for pk in self.sample(ingredient_ids,
+                                       options['ingredients_per_recipe']))
+            )
+            self.insert(
+                'follows', Follow,
+                (Follow(user_id=user_id, author_id=author_id)
+                 for user_id in user_ids
+                 for author_id in self.sample(user_ids, options['follows'])
+                 if author_id != user_id)
+            )
+            for label, model, per_user in (
+                ('favorites', Favorite, options['favorites']),
+                ('shopping carts', ShoppingCart, options['cart']),
+            ):
+                self.insert(
+                    label, model,
+                    (model(user_id=user_id, recipe_id=recipe_id)
+                     for user_id in user_ids
+                     for recipe_id in self.sample(recipe_ids, per_user))
+                )
+            # bulk_create skips the receivers that keep these in sync.
+            self.step('recipe counters', Recipe.objects.recount)
+            self.step('shopping lists', ShoppingListItem.objects.rebuild)
+            for model in (Tag, Recipe, User):
+                bulk_changed.send(sender=model)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded the dataset in {time.perf_counter() - started:.1f} s'))
+
+    def sample(self, population, count):
+        return self.rng.sample(population, min(count, len(population)))
+
+    def step(self, label, function):
+        started = time.perf_counter()
+        function()
+        self.stdout.write(
+            f'{label}: {time.perf_counter() - started:.1f} s')
+
+    def insert(self, label, model, objects, keep_ids=False):
+        started = time.perf_counter()
+        ids, rows = [], 0
+        for batch in batches(objects, self.chunk_size):
+            created = model.objects.bulk_create(batch)
+            rows += len(created)
+            if keep_ids:
+                ids.extend(obj.pk for obj in created)
+        self.stdout.write(f'{label}: {rows} rows, '
+                          f'{time.perf_counter() - started:.1f} s')
+        return ids
+
+    def seed_users(self, count):
+        # Hashing is deliberately slow, so every user shares one hash.
+        password = make_password('testpassword')
+        return self.insert('users', User, (
+            User(
+                username=f'{USERNAME_PREFIX}{i}',
+                email=f'{USERNAME_PREFIX}{i}@example.com',
+                password=password,
+                first_name=self.rng.choice(FIRST_NAMES),
+                last_name=self.rng.choice(LAST_NAMES),
+            )
+            for i in range(count)
+        ), keep_ids=True)
+
+    def seed_tags(self):
+        for name, color, slug in TAGS_DATA:
+            Tag.objects.get_or_create(
+                slug=slug, defaults={'name': name, 'color': color})
+        return list(Tag.objects.order_by('id').values_list('id', flat=True))
+
+    def seed_recipes(self, count, user_ids):
+        buffer = io.BytesIO()
+        Image.new('RGB', (1200, 800), '#E26C2D').save(buffer, 'PNG')
+        storage = Recipe._meta.get_field('image').storage
+        image = storage.save('recipes/images/seed.png',
+                             ContentFile(buffer.getvalue()))
+        recipe_ids = self.insert('recipes', Recipe, (
+            Recipe(
+                author_id=self.rng.choice(user_ids),
+                name=f'{self.rng.choice(DISHES)} №{i + 1}',
+                text='Рецепт для нагрузочного тестирования.',
+                cooking_time=self.rng.randint(5, 180),
+                pub_date=SEED_EPOCH + timedelta(minutes=i),
+                image=image,
+            )
+            for i in range(count)
+        ), keep_ids=True)
+        if not recipe_ids:
+            return recipe_ids
+        # Every recipe shares the image, so it is stored and rendered once
+        # and the other recipes only add references.
+        generate_variants(recipe_ids[0])
+        variants = Recipe.objects.get(pk=recipe_ids[0]).image_variants
+        Recipe.objects.filter(image=image).update(image_variants=variants)
+        storage.retain(image, len(recipe_ids) - 1)
+        for names in variants.values():
+            if isinstance(names, dict):
+                for name in names.values():
+                    storage.retain(name, len(recipe_ids) - 1)
+        return recipe_ids
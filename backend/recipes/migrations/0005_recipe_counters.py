@@ -0,0 +1,48 @@
+# Generated by Django 4.2.18 on 2026-10-17 17:08
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_recipes(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+
+    def live_count(model_name):
+        model = apps.get_model('recipes', model_name)
+        return Coalesce(models.Subquery(
+            model.objects.filter(recipe=models.OuterRef('pk'))
+            .values('recipe').annotate(count=models.Count('id'))
+            .values('count')
+        ), 0)
+
+    Recipe.objects.update(favorites_count=live_count('Favorite'),
+                          in_cart_count=live_count('ShoppingCart'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлений в избранное'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_cart_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлений в корзину'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-id'], name='recipe_favorites_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-in_cart_count', '-id'], name='recipe_in_cart_count_idx'),
+        ),
+        migrations.RunPython(count_recipes, migrations.RunPython.noop),
+    ]
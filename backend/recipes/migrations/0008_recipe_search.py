@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from recipes import search
+
+
+def install(apps, schema_editor):
+    search.install(schema_editor)
+
+
+def uninstall(apps, schema_editor):
+    search.uninstall(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
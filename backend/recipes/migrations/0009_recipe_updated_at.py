@@ -0,0 +1,36 @@
+# Generated by Django 4.2.18 on 2026-10-17 17:24
+
+from django.db import migrations, models
+
+from recipes import search
+
+
+def fill_updated_at(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.update(updated_at=models.F('pub_date'))
+
+
+def reinstall_search(apps, schema_editor):
+    # Changing the columns rebuilds the table on SQLite, which drops the
+    # triggers of the full-text index.
+    if schema_editor.connection.vendor == 'sqlite':
+        search.uninstall(schema_editor)
+        search.install(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, reinstall_search),
+        migrations.AddField(
+            model_name='recipe',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+        migrations.RunPython(reinstall_search, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,9 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.dispatch import Signal
 from colorfield.fields import ColorField
 
 from foodgram.const import (
@@ -15,9 +17,18 @@ from foodgram.const import (
     MIN_INGREDIENT_AMOUNT,
     MAX_INGREDIENT_AMOUNT,
 )
+from recipes.storage import recipe_image_storage
 
 User = get_user_model()
 
+# Changed by single-statement F() updates (see api.signals) and left out
+# of Recipe.save_content.
+RECIPE_COUNTERS = ('favorites_count', 'in_cart_count')
+
+# Sent with the model as sender by code that changes its rows in bulk,
+# which sends no post_save or post_delete, so caches can be invalidated.
+bulk_changed = Signal()
+
 
 class Tag(models.Model):
     name = models.CharField(max_length=TAG_NAME_MAX_LENGTH, unique=True)
@@ -46,6 +57,49 @@ class Ingredient(models.Model):
         return self.name
 
 
+def live_count(model):
+    """Number of ``model`` rows pointing at the outer recipe."""
+    return Coalesce(models.Subquery(
+        model.objects.filter(recipe=models.OuterRef('pk'))
+        .values('recipe').annotate(count=models.Count('id'))
+        .values('count')
+    ), 0)
+
+
+class RecipeQuerySet(models.QuerySet):
+    def with_live_counters(self):
+        return self.annotate(live_favorites_count=live_count(Favorite),
+                             live_in_cart_count=live_count(ShoppingCart))
+
+    def recount(self):
+        """Recompute the denormalized counters in a single UPDATE."""
+        return self.update(favorites_count=live_count(Favorite),
+                           in_cart_count=live_count(ShoppingCart))
+
+    def with_user_flags(self, user):
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=models.Value(False),
+                is_in_shopping_cart=models.Value(False)
+            )
+        return self.annotate(
+            is_favorited=models.Exists(Favorite.objects.filter(
+                user=user, recipe=models.OuterRef('pk'))),
+            is_in_shopping_cart=models.Exists(ShoppingCart.objects.filter(
+                user=user, recipe=models.OuterRef('pk')))
+        )
+
+
+class StoredFile(models.Model):
+    """Number of references to a file in content-addressed storage."""
+
+    name = models.CharField(max_length=255, unique=True)
+    references = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.name
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
@@ -53,7 +107,9 @@ class Recipe(models.Model):
         related_name='recipes'
     )
     name = models.CharField(max_length=RECIPE_NAME_MAX_LENGTH)
-    image = models.ImageField(upload_to='recipes/images/')
+    image = models.ImageField(upload_to='recipes/images/',
+                              storage=recipe_image_storage)
+    image_variants = models.JSONField(default=dict, editable=False)
     text = models.TextField()
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -66,13 +122,57 @@ class Recipe(models.Model):
                     MaxValueValidator(MAX_COOKING_TIME)]
     )
     pub_date = models.DateTimeField(default=timezone.now)
+    # Moves on every change to the API representation of the recipe,
+    # including its tags and ingredients; see api.signals.
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
+    favorites_count = models.PositiveIntegerField(
+        'Добавлений в избранное', default=0, editable=False
+    )
+    in_cart_count = models.PositiveIntegerField(
+        'Добавлений в корзину', default=0, editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=['-favorites_count', '-id'],
+                         name='recipe_favorites_count_idx'),
+            models.Index(fields=['-in_cart_count', '-id'],
+                         name='recipe_in_cart_count_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The image name as stored, so that api.signals can release a
+        # replaced image without reading the row again.
+        if 'image' in instance.__dict__:
+            instance.stored_image = instance.__dict__['image']
+        return instance
+
+    def save_content(self):
+        """Save an existing recipe without its counters.
+
+        Writing the loaded counters back would undo the increments made
+        since the recipe was read. Like any save with update_fields, it
+        raises DatabaseError if the row has been deleted meanwhile.
+        """
+        self.save(update_fields=[
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and field.name not in RECIPE_COUNTERS
+        ])
+
+    @property
+    def image_variants_ready(self):
+        return self.image_variants.get('source') == self.image.name
+
 
 class RecipeIngredient(models.Model):
     recipe = models.ForeignKey(
@@ -96,6 +196,17 @@ class RecipeIngredient(models.Model):
             )
         ]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_stored_row()
+        return instance
+
+    def remember_stored_row(self):
+        """Keep the row as stored, for the shopping list deltas of a save."""
+        self.stored_row = (self.recipe_id, self.ingredient_id,
+                           self.__dict__.get('amount'))
+
 
 class Favorite(models.Model):
     user = models.ForeignKey(
@@ -137,3 +248,103 @@ class ShoppingCart(models.Model):
                 name='unique_cart_item'
             )
         ]
+
+
+class ShoppingListQuerySet(models.QuerySet):
+    def live_totals(self):
+        """The aggregate computed from the carts, per user and ingredient."""
+        return (
+            RecipeIngredient.objects
+            .values('ingredient_id',
+                    user_id=models.F('recipe__in_shopping_cart__user'))
+            .filter(user_id__isnull=False)
+            .annotate(live_total=models.Sum('amount'))
+        )
+
+    def rebuild(self, batch_size=1000):
+        """Replace every stored row with the live totals."""
+        self.all().delete()
+        self.bulk_create(
+            (self.model(user_id=item['user_id'],
+                        ingredient_id=item['ingredient_id'],
+                        total=item['live_total'])
+             for item in self.live_totals().iterator()),
+            batch_size=batch_size
+        )
+
+    def apply_deltas(self, user_ids, deltas):
+        """Add ``deltas`` ({ingredient_id: amount}) to every user's list."""
+        user_ids = list(user_ids)
+        deltas = {pk: delta for pk, delta in deltas.items() if delta}
+        if not user_ids or not deltas:
+            return
+        # Rows are inserted first and then incremented in place, so two
+        # concurrent additions for the same user never lose an amount.
+        self.bulk_create(
+            (self.model(user_id=user_id, ingredient_id=pk, total=0)
+             for user_id in user_ids
+             for pk, delta in deltas.items() if delta > 0),
+            ignore_conflicts=True
+        )
+        rows = self.filter(user_id__in=user_ids, ingredient_id__in=deltas)
+        rows.update(total=models.F('total') + models.Case(
+            *(models.When(ingredient_id=pk, then=models.Value(delta))
+              for pk, delta in deltas.items()),
+            output_field=models.IntegerField()
+        ))
+        rows.filter(total__lte=0).delete()
+
+    def add_recipe(self, user_id, recipe_id, sign=1):
+        amounts = RecipeIngredient.objects.filter(
+            recipe_id=recipe_id).values_list('ingredient_id', 'amount')
+        self.apply_deltas(
+            [user_id], {pk: sign * amount for pk, amount in amounts}
+        )
+
+    def remove_recipe(self, user_id, recipe_id):
+        self.add_recipe(user_id, recipe_id, sign=-1)
+
+    def for_export(self, user):
+        """Rows of a user's list as the shopping list exports take them."""
+        return (
+            self.filter(user=user)
+            .values('total', name=models.F('ingredient__name'),
+                    unit=models.F('ingredient__measurement_unit'))
+            .order_by('name')
+        )
+
+    def change_recipe(self, recipe_id, old_amounts, new_amounts):
+        """Move the lists of every user who carted the recipe to new amounts."""
+        self.apply_deltas(
+            ShoppingCart.objects.filter(recipe_id=recipe_id)
+            .values_list('user_id', flat=True),
+            {pk: new_amounts.get(pk, 0) - old_amounts.get(pk, 0)
+             for pk in old_amounts.keys() | new_amounts.keys()}
+        )
+
+
+class ShoppingListItem(models.Model):
+    """Total amount of an ingredient over all recipes in a user's cart.
+
+    Maintained incrementally in the transaction that changes the cart or
+    a carted recipe's ingredients: by receivers in api.signals, and by the
+    callers of bulk_create and bulk_update, which send no signals.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list'
+    )
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE)
+    total = models.IntegerField(default=0)
+
+    objects = ShoppingListQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item'
+            )
+        ]
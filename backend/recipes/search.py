@@ -0,0 +1,116 @@
+"""Full-text search over recipe names and descriptions.
+
+PostgreSQL keeps a generated ``tsvector`` column with a GIN index and
+SQLite an FTS5 table synced by triggers, so the database itself updates
+the index on every insert, update and delete, bulk ones included.
+Other backends fall back to ``icontains``.
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+PG_CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+
+PG_INSTALL = [
+    f"""ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('{PG_CONFIG}'::regconfig,
+                                  coalesce(name, '')), 'A')
+            || setweight(to_tsvector('{PG_CONFIG}'::regconfig,
+                                     coalesce(text, '')), 'B')
+        ) STORED""",
+    """CREATE INDEX recipe_search_vector_idx ON recipes_recipe
+        USING gin (search_vector)""",
+]
+PG_UNINSTALL = [
+    'DROP INDEX IF EXISTS recipe_search_vector_idx',
+    'ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector',
+]
+
+SQLITE_INSTALL = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        name, text, content='recipes_recipe', content_rowid='id'
+    )""",
+    f"""CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON recipes_recipe
+    BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON recipes_recipe
+    BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_update
+    AFTER UPDATE OF name, text ON recipes_recipe
+    BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+        INSERT INTO {FTS_TABLE} (rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END""",
+    f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')",
+]
+SQLITE_UNINSTALL = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_insert',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_delete',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_update',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+STATEMENTS = {
+    'postgresql': (PG_INSTALL, PG_UNINSTALL),
+    'sqlite': (SQLITE_INSTALL, SQLITE_UNINSTALL),
+}
+
+
+def install(schema_editor):
+    install_sql, _ = STATEMENTS.get(schema_editor.connection.vendor, ([], []))
+    for sql in install_sql:
+        schema_editor.execute(sql)
+
+
+def uninstall(schema_editor):
+    _, uninstall_sql = STATEMENTS.get(schema_editor.connection.vendor,
+                                      ([], []))
+    for sql in uninstall_sql:
+        schema_editor.execute(sql)
+
+
+def fts_query(query):
+    """Quote every word so user input cannot use FTS5 query syntax."""
+    return ' '.join(f'"{word}"' for word in re.findall(r'\w+', query))
+
+
+def search(queryset, query):
+    """Recipes matching ``query``, best ranked first."""
+    if connection.vendor == 'postgresql':
+        tsquery = f"websearch_to_tsquery('{PG_CONFIG}', %s)"
+        matches = RawSQL(f'recipes_recipe.search_vector @@ {tsquery}',
+                         (query,), output_field=BooleanField())
+        rank = RawSQL(f'ts_rank(recipes_recipe.search_vector, {tsquery})',
+                      (query,), output_field=FloatField())
+    elif connection.vendor == 'sqlite':
+        query = fts_query(query)
+        if not query:
+            return queryset.none()
+        matches = RawSQL(
+            f'recipes_recipe.id IN (SELECT rowid FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s)',
+            (query,), output_field=BooleanField())
+        # bm25() is lower for better matches; names weigh more than text.
+        rank = RawSQL(
+            f'(SELECT -bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = recipes_recipe.id)',
+            (query,), output_field=FloatField())
+    else:
+        return queryset.filter(Q(name__icontains=query)
+                               | Q(text__icontains=query))
+    return (
+        queryset.filter(matches)
+        .annotate(search_rank=rank)
+        .order_by('-search_rank', *queryset.model._meta.ordering)
+    )
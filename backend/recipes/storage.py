@@ -0,0 +1,80 @@
+import hashlib
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+CONTENT_ADDRESSED_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage that keeps each distinct content once.
+
+    A file is named by the SHA-256 of its bytes and sharded into two
+    levels of subdirectories, e.g. ``recipes/images/ab/cd/abcd….png``.
+    Saving bytes that are already stored only adds a reference, and
+    ``delete`` removes the file once the last reference is released.
+    References are rows of ``StoredFile`` and change in the caller's
+    transaction; files are removed only after it commits.
+    """
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(
+            directory, digest[:2], digest[2:4], digest + extension
+        ).replace('\\', '/')
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        if not self.exists(name):
+            name = super()._save(name, content)
+        self.retain(name)
+        return name
+
+    def retain(self, name, count=1):
+        """Add ``count`` references to a stored file.
+
+        Used for rows that point at the file without going through
+        ``save``, e.g. bulk-created ones.
+        """
+        from recipes.models import StoredFile
+
+        with transaction.atomic():
+            StoredFile.objects.get_or_create(name=name)
+            StoredFile.objects.filter(name=name).update(
+                references=F('references') + count)
+
+    def delete(self, name):
+        from recipes.models import StoredFile
+
+        with transaction.atomic():
+            if StoredFile.objects.filter(
+                    name=name, references__gt=1).update(
+                        references=F('references') - 1):
+                return
+            # Files without a reference row predate this storage and
+            # may be shared, so they are left alone.
+            if StoredFile.objects.filter(name=name).delete()[0]:
+                transaction.on_commit(lambda: self._delete_unreferenced(name))
+
+    def _delete_unreferenced(self, name):
+        from recipes.models import StoredFile
+
+        if not StoredFile.objects.filter(name=name).exists():
+            super().delete(name)
+
+    @staticmethod
+    def is_content_addressed(name):
+        return bool(CONTENT_ADDRESSED_NAME.search(name))
+
+
+recipe_image_storage = ContentAddressedStorage()
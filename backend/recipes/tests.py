@@ -0,0 +1,99 @@
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.test import TestCase, override_settings
+
+from recipes.models import Recipe, StoredFile
+from recipes.storage import recipe_image_storage
+from users.models import User
+
+
+class StorageTestCase(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.storage = recipe_image_storage
+
+    def save(self, name, content):
+        return self.storage.save(f'recipes/images/{name}',
+                                 ContentFile(content))
+
+    def references(self, name):
+        return StoredFile.objects.filter(name=name).values_list(
+            'references', flat=True).first()
+
+
+class ContentAddressedStorageTest(StorageTestCase):
+    """Each content is stored once and removed with its last reference."""
+
+    def test_same_content_is_stored_once(self):
+        first = self.save('first.png', b'image')
+        second = self.save('second.png', b'image')
+        self.assertEqual(first, second)
+        self.assertTrue(self.storage.is_content_addressed(first))
+        self.assertEqual(self.references(first), 2)
+        self.assertNotEqual(self.save('other.png', b'other'), first)
+
+    def test_file_is_deleted_with_last_reference(self):
+        name = self.save('first.png', b'image')
+        self.save('second.png', b'image')
+        self.storage.delete(name)
+        self.assertEqual(self.references(name), 1)
+        self.assertTrue(self.storage.exists(name))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.storage.delete(name)
+        self.assertIsNone(self.references(name))
+        self.assertFalse(self.storage.exists(name))
+
+    def test_file_without_references_is_kept(self):
+        name = FileSystemStorage().save('recipes/images/legacy.png',
+                                        ContentFile(b'image'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.storage.delete(name)
+        self.assertTrue(self.storage.exists(name))
+
+
+class RecipeImageReleaseTest(StorageTestCase):
+    """Saving a recipe releases the image it replaces."""
+
+    def setUp(self):
+        super().setUp()
+        self.image = self.save('recipe.png', b'image')
+        self.recipe = Recipe.objects.create(
+            author=User.objects.create_user(
+                email='author@example.com', username='author',
+                first_name='Имя', last_name='Фамилия', password='password'
+            ),
+            name='Рецепт', text='Текст', cooking_time=10, image=self.image
+        )
+
+    def test_replaced_image_is_released(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        recipe.image = self.save('new.png', b'new image')
+        recipe.save_content()
+        self.assertIsNone(self.references(self.image))
+        self.assertEqual(self.references(recipe.image.name), 1)
+
+    def test_kept_image_is_not_released(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        recipe.name = 'Новое название'
+        # Only the UPDATE: the stored image name came with the row.
+        with self.assertNumQueries(1):
+            recipe.save_content()
+        self.assertEqual(self.references(self.image), 1)
+
+    def test_save_without_image_skips_release(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        recipe.image = self.save('new.png', b'new image')
+        recipe.save(update_fields=['name'])
+        self.assertEqual(self.references(self.image), 1)
+
+    def test_recipe_loaded_without_image_reads_it(self):
+        recipe = Recipe.objects.filter(pk=self.recipe.pk).defer('image')[0]
+        recipe.image = self.save('new.png', b'new image')
+        recipe.save()
+        self.assertIsNone(self.references(self.image))